@@ -0,0 +1,96 @@
+"""Measures CPU time and bytes on the wire for a large task list.
+
+Run from the backend directory:
+    python benchmarks/serialization.py [--rows 100000] [--runs 3]
+
+Compares FastAPI's default path (response model validation, jsonable_encoder and
+json.dumps) with the streamed orjson path used by the list endpoints, without
+compression and with gzip and brotli. No database is needed, the rows are
+generated in memory.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from main import TaskBase
+from services.compression import CompressionMiddleware
+from services.serialization import rows_response
+
+
+def task_rows(count: int) -> List[dict]:
+    return [{
+        "id": f"4b0c2f0e-8d7a-4c55-9a7e-{index:012d}",
+        "title": f"Prepare the quarterly report, part {index}",
+        "status": ("todo", "in-progress", "completed")[index % 3],
+        "category": "reporting",
+        "priority": ("low", "medium", "high")[index % 3],
+        "due_date": f"2025-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+        "project_id": f"project-{index % 20}",
+        "description": "Collect the numbers from every team and summarise them for the board.",
+        "employee_id": f"employee-{index % 50}",
+        "created_at": "2025-01-01T09:30:00.000000",
+        "file_name": None,
+        "file": None,
+        "folder_id": None,
+    } for index in range(count)]
+
+
+def build_app(rows: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=List[TaskBase])
+    async def default():
+        return rows
+
+    @app.get("/streamed")
+    async def streamed():
+        return rows_response(rows)
+
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+def measure(client: TestClient, path: str, encoding: str, runs: int):
+    cpu, wall = [], []
+    for _ in range(runs):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        response = client.get(path, headers={"Accept-Encoding": encoding})
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+        response.raise_for_status()
+    # Bytes read from the socket, before httpx decodes the body
+    return statistics.median(cpu), statistics.median(wall), response.num_bytes_downloaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = task_rows(args.rows)
+    client = TestClient(build_app(rows))
+    scenarios = [
+        ("default", "/default", "identity"),
+        ("streamed", "/streamed", "identity"),
+        ("streamed", "/streamed", "gzip"),
+        ("streamed", "/streamed", "br"),
+    ]
+    print(f"{args.rows} task rows, median of {args.runs} runs")
+    print(f"{'path':<10} {'encoding':<10} {'cpu ms':>9} {'wall ms':>9} {'bytes':>12}")
+    for name, path, encoding in scenarios:
+        cpu, wall, size = measure(client, path, encoding, args.runs)
+        print(f"{name:<10} {encoding:<10} {cpu * 1000:9.0f} {wall * 1000:9.0f} {size:12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Measures the import cost of the API and its time to first request.
+
+Run from the backend directory:
+    python benchmarks/startup.py [--runs 5] [--skip-server]
+
+The time to first request starts the server in a subprocess, so it needs the
+same .env as a normal run.
+"""
+import os
+import re
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_time() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def heaviest_imports(limit: int = 10):
+    """Returns the packages imported by main with the highest cumulative import time, in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if not match:
+            continue
+        cumulative, indent, module = match.groups()
+        # Only count modules imported directly by main, not their dependencies
+        if len(indent) == 3:
+            package = module.split(".")[0]
+            packages[package] = packages.get(package, 0) + int(cumulative) / 1000
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def time_to_first_request(timeout: float = 60) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:create_app", "--factory", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited during startup, check the .env file")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("Server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summary(samples) -> str:
+    return f"median {statistics.median(samples) * 1000:.0f} ms, min {min(samples) * 1000:.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-server", action="store_true", help="only measure the import cost")
+    args = parser.parse_args()
+
+    print(f"import main: {summary([import_time() for _ in range(args.runs)])}")
+    print("heaviest imports:")
+    for package, milliseconds in heaviest_imports():
+        print(f"  {package:<24} {milliseconds:8.1f} ms")
+    if not args.skip_server:
+        print(f"time to first request: {summary([time_to_first_request() for _ in range(args.runs)])}")
+
+
+if __name__ == "__main__":
+    main()
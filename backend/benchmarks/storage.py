@@ -0,0 +1,129 @@
+"""Compares per-request latency of the API on the Supabase and SQLite backends.
+
+Run from the backend directory:
+    python benchmarks/storage.py [--requests 200] [--rows 5000] [--writes]
+
+SQLite runs against a temporary database seeded with --rows tasks. Supabase
+runs against the database from .env and is skipped without credentials. It only
+reads, unless --writes is given, which creates and deletes reminders there.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(rows: int):
+    from database.repository import create_repository
+
+    db = create_repository("sqlite")
+    for index in range(rows):
+        db.insert("tasks", {
+            "id": f"task-{index}",
+            "title": f"Task {index}",
+            "status": "completed" if index % 3 == 0 else "todo",
+            "priority": "medium",
+            "due_date": f"2025-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+            "employee_id": f"employee-{index % 50}",
+            "project_id": f"project-{index % 20}",
+            "created_at": "2025-01-01T00:00:00",
+        })
+
+
+def timed(client, method: str, url: str, **kwargs) -> float:
+    start = time.perf_counter()
+    response = client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return elapsed
+
+
+def run_child(backend: str, requests: int, writes: bool) -> dict:
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main
+
+    results = {}
+    with TestClient(main.create_app()) as client:
+        tasks = client.get("/tasks").json()
+        task = tasks[0] if tasks else None
+        scenarios = [
+            ("GET /tasks?employee_id", "GET", f"/tasks?employee_id={task['employee_id']}" if task else None),
+            ("GET /tasks/{id}", "GET", f"/tasks/{task['id']}" if task else None),
+            ("GET /reminders?status=false", "GET", "/reminders?status=false"),
+        ]
+        for name, method, url in scenarios:
+            if url:
+                results[name] = [timed(client, method, url) for _ in range(requests)]
+
+        if writes:
+            samples = []
+            for index in range(requests):
+                start = time.perf_counter()
+                reminder = client.post("/reminders", json={
+                    "title": f"Benchmark {index}", "due_date": "2099-01-01T00:00:00", "priority": "low", "status": False,
+                }).json()
+                client.delete(f"/reminders/{reminder['id']}")
+                samples.append(time.perf_counter() - start)
+            results["POST + DELETE /reminders"] = samples
+    return results
+
+
+def run_backend(backend: str, args) -> dict:
+    env = dict(os.environ, DATABASE_BACKEND=backend)
+    command = [sys.executable, __file__, "--child", backend, "--requests", str(args.requests)]
+    if backend == "sqlite":
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        env["SQLITE_PATH"] = path
+        command += ["--rows", str(args.rows), "--writes"]
+    elif args.writes:
+        command.append("--writes")
+    try:
+        output = subprocess.run(command, env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    finally:
+        if backend == "sqlite":
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--writes", action="store_true", help="also benchmark writes on Supabase")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, BACKEND_DIR)
+        if args.child == "sqlite":
+            seed(args.rows)
+        print(json.dumps(run_child(args.child, args.requests, args.writes)))
+        return
+
+    backends = ["sqlite"]
+    if os.environ.get("SUPABASE_URL") or os.path.exists(os.path.join(BACKEND_DIR, ".env")):
+        backends.append("supabase")
+    else:
+        print("Supabase credentials not found, only benchmarking SQLite")
+
+    print(f"{'backend':<10} {'request':<30} {'p50 ms':>8} {'p95 ms':>8}")
+    for backend in backends:
+        for name, samples in run_backend(backend, args).items():
+            samples = sorted(samples)
+            p50 = statistics.median(samples) * 1000
+            p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+            print(f"{backend:<10} {name:<30} {p50:8.2f} {p95:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
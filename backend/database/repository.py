@@ -0,0 +1,158 @@
+import os
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+# Supabase returns at most max-rows rows per request (1000 unless configured)
+SELECT_PAGE_SIZE = int(os.environ.get("SELECT_PAGE_SIZE", 1000))
+
+Row = Dict[str, Any]
+Filters = Optional[Dict[str, Any]]
+Buckets = Dict[str, Dict[str, Any]]
+
+
+def bucket_rows(rows: List[Row], column: str, top: int) -> Buckets:
+    """Groups rows by the date part of `column` into {day: {"count", "items"}}, keeping the first `top` rows of each day."""
+    buckets: Buckets = {}
+    for row in sorted(rows, key=lambda row: (str(row[column]), str(row.get("id")))):
+        bucket = buckets.setdefault(str(row[column])[:10], {"count": 0, "items": []})
+        bucket["count"] += 1
+        if len(bucket["items"]) < top:
+            bucket["items"].append(row)
+    return buckets
+
+
+class Repository:
+    """Storage interface used by the API handlers.
+
+    Filters are column -> value mappings: `eq` and `neq` compare for (in)equality,
+    `gte` and `lte` are inclusive range bounds and `gt` and `lt` exclusive ones.
+    Every method returns the affected rows as plain dicts.
+    """
+
+    def select(self, table: str, columns: str = "*", *, eq: Filters = None, neq: Filters = None,
+               gte: Filters = None, lte: Filters = None, gt: Filters = None, lt: Filters = None,
+               order: Optional[str] = None, desc: bool = False, limit: Optional[int] = None) -> List[Row]:
+        raise NotImplementedError
+
+    def select_all(self, table: str, columns: str = "*", *, key: str = "id", page_size: int = SELECT_PAGE_SIZE,
+                   eq: Filters = None, neq: Filters = None, gte: Filters = None, lte: Filters = None,
+                   lt: Filters = None) -> List[Row]:
+        """Selects every matching row, reading pages of `page_size` rows ordered by `key`.
+
+        A plain select can be cut short by the server's row limit. Pages continue
+        after the last key read rather than at an offset, so rows deleted during the
+        scan do not shift later rows out of it.
+        """
+        names = [name.strip() for name in columns.split(",")]
+        if "*" not in names and key not in names:
+            columns += f",{key}"
+        rows: List[Row] = []
+        after: Filters = None
+        while True:
+            page = self.select(table, columns, eq=eq, neq=neq, gte=gte, lte=lte, gt=after, lt=lt,
+                               order=key, limit=page_size)
+            # A short page is not the end, the server may cap pages below page_size
+            if not page:
+                return rows
+            rows.extend(page)
+            after = {key: page[-1][key]}
+
+    def count(self, table: str, *, eq: Filters = None, neq: Filters = None, gte: Filters = None,
+              lte: Filters = None, lt: Filters = None) -> int:
+        """Counts the matching rows."""
+        return len(self.select_all(table, "id", eq=eq, neq=neq, gte=gte, lte=lte, lt=lt))
+
+    def insert(self, table: str, row: Row) -> List[Row]:
+        raise NotImplementedError
+
+    def insert_many(self, table: str, rows: List[Row]) -> List[Row]:
+        """Inserts several rows in one round trip."""
+        raise NotImplementedError
+
+    def upsert(self, table: str, row: Row) -> List[Row]:
+        raise NotImplementedError
+
+    def update(self, table: str, data: Row, *, eq: Filters = None, neq: Filters = None) -> List[Row]:
+        raise NotImplementedError
+
+    def delete(self, table: str, *, eq: Filters = None, lt: Filters = None) -> List[Row]:
+        raise NotImplementedError
+
+    def bucket_by_day(self, table: str, column: str, start: str, end: str, *, columns: str = "*",
+                      eq: Filters = None, top: int = 3) -> Buckets:
+        """Counts the rows per day of `column` in [start, end) and returns the earliest `top` rows of each day."""
+        rows = self.select_all(table, columns, eq=eq, gte={column: start}, lt={column: end})
+        return bucket_rows(rows, column, top)
+
+    def get(self, table: str, row_id: str) -> Optional[Row]:
+        rows = self.select(table, eq={"id": row_id})
+        return rows[0] if rows else None
+
+
+class AsyncRepository:
+    """Awaitable view of a repository, for code running on the event loop.
+
+    Every call runs in a worker thread, so a slow or retried database call holds
+    that thread instead of stalling every request of the worker. `on_write` is
+    called with the table name after every write, even a failed one, since it may
+    have been applied.
+    """
+
+    def __init__(self, repository: Repository, on_write: Optional[Callable[[str], None]] = None):
+        self.repository = repository
+        self.on_write = on_write
+
+    async def _write(self, fn: Callable[..., Any], table: str, *args, **kwargs) -> List[Row]:
+        try:
+            return await asyncio.to_thread(fn, table, *args, **kwargs)
+        finally:
+            if self.on_write:
+                self.on_write(table)
+
+    async def select(self, table: str, columns: str = "*", **filters) -> List[Row]:
+        return await asyncio.to_thread(self.repository.select, table, columns, **filters)
+
+    async def select_all(self, table: str, columns: str = "*", **filters) -> List[Row]:
+        return await asyncio.to_thread(self.repository.select_all, table, columns, **filters)
+
+    async def get(self, table: str, row_id: str) -> Optional[Row]:
+        return await asyncio.to_thread(self.repository.get, table, row_id)
+
+    async def insert(self, table: str, row: Row) -> List[Row]:
+        return await self._write(self.repository.insert, table, row)
+
+    async def insert_many(self, table: str, rows: List[Row]) -> List[Row]:
+        return await self._write(self.repository.insert_many, table, rows)
+
+    async def upsert(self, table: str, row: Row) -> List[Row]:
+        return await self._write(self.repository.upsert, table, row)
+
+    async def update(self, table: str, data: Row, **filters) -> List[Row]:
+        return await self._write(self.repository.update, table, data, **filters)
+
+    async def delete(self, table: str, **filters) -> List[Row]:
+        return await self._write(self.repository.delete, table, **filters)
+
+
+def create_repository(backend: Optional[str] = None) -> Repository:
+    """Creates the repository selected by DATABASE_BACKEND: supabase (default) or sqlite."""
+    backend = backend or os.environ.get("DATABASE_BACKEND", "supabase")
+    if backend == "sqlite":
+        from database.sqlite import SQLiteRepository
+
+        return SQLiteRepository(os.environ.get("SQLITE_PATH", "crm.db"))
+    if backend == "supabase":
+        from database.supabase import SupabaseRepository, get_supabase_client
+
+        return SupabaseRepository(get_supabase_client())
+    raise ValueError(f"Unknown database backend: {backend}")
+
+
+_repository: Optional[Repository] = None
+
+def get_repository() -> Repository:
+    """Returns the configured repository, creating it on first use."""
+    global _repository
+    if _repository is None:
+        _repository = create_repository()
+    return _repository
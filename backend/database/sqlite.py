@@ -0,0 +1,345 @@
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Tuple
+
+from database.repository import Repository, Row, Buckets
+
+# Column types: text, integer, bool (stored as 0/1) and json (stored as text)
+TABLES: Dict[str, Dict[str, str]] = {
+    "projects": {
+        "id": "text", "title": "text", "description": "text", "start_date": "text",
+        "end_date": "text", "status": "text", "created_at": "text",
+    },
+    "tasks": {
+        "id": "text", "title": "text", "status": "text", "category": "text", "priority": "text",
+        "due_date": "text", "project_id": "text", "description": "text", "employee_id": "text",
+        "created_at": "text", "file_name": "text", "file": "text", "file_id": "text",
+        "folder_id": "text", "notified": "bool",
+    },
+    "notes": {
+        "id": "text", "title": "text", "category": "text", "description": "text",
+        "employee_id": "text", "project_id": "text", "created_at": "text", "file": "text",
+        "file_url": "text",
+    },
+    "events": {
+        "id": "text", "title": "text", "description": "text", "due_date": "text", "type": "text",
+        "project_id": "text", "employee_id": "text", "rrule": "text", "exdates": "json",
+        "recurrence_end": "text",
+    },
+    "reminders": {
+        "id": "text", "title": "text", "due_date": "text", "priority": "text", "status": "bool",
+        "project_id": "text", "employee_id": "text", "notified": "bool",
+    },
+    "files": {
+        "id": "text", "title": "text", "file_type": "text", "file_path": "text", "file_size": "text",
+        "project_id": "text", "employee_id": "text", "note_id": "text", "task_id": "text",
+        "parent_folder_id": "text", "created_at": "text", "folder_id": "text",
+    },
+    "employees": {
+        "id": "text", "name": "text", "project_id": "text", "role": "text", "status": "bool",
+    },
+    "folders": {
+        "id": "text", "title": "text", "parent": "text",
+    },
+    "file_previews": {
+        "file_id": "text", "thumbnail": "text", "mime_type": "text", "preview_text": "text",
+    },
+    "activity": {
+        "id": "text", "created_at": "text", "action": "text", "entity": "text", "entity_id": "text",
+        "title": "text", "project_id": "text", "employee_id": "text",
+    },
+    "idempotency_keys": {
+        "id": "text", "created_at": "text", "fingerprint": "text", "status": "integer", "headers": "json",
+        "body": "text",
+    },
+    "notifications": {
+        "id": "text", "created_at": "text", "payload": "json",
+    },
+    "workload_counters": {
+        "id": "text", "total_tasks": "integer", "open_tasks": "integer", "completed_tasks": "integer",
+        "total_reminders": "integer", "pending_reminders": "integer", "events": "integer", "notes": "integer",
+    },
+}
+
+PRIMARY_KEYS = {"file_previews": "file_id"}
+
+DEFAULTS = {
+    ("tasks", "notified"): "0",
+    ("reminders", "notified"): "0",
+    **{("workload_counters", column): "0" for column in TABLES["workload_counters"] if column != "id"},
+}
+
+# What a row adds to the workload counters of its employee and project, as in services.rollups.
+# `{row}` is NEW or OLD in a trigger, or the table itself when counting existing rows.
+WORKLOAD_CONTRIBUTIONS = {
+    "tasks": {
+        "total_tasks": "1",
+        "open_tasks": "{row}.status IS NOT 'completed'",
+        "completed_tasks": "{row}.status IS 'completed'",
+    },
+    "reminders": {"total_reminders": "1", "pending_reminders": "NOT coalesce({row}.status, 0)"},
+    "events": {"events": "1"},
+    "notes": {"notes": "1"},
+}
+WORKLOAD_ENTITIES = {"employees": "employee_id", "projects": "project_id"}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS tasks_project_idx ON tasks (project_id)",
+    "CREATE INDEX IF NOT EXISTS tasks_employee_idx ON tasks (employee_id)",
+    "CREATE INDEX IF NOT EXISTS tasks_pending_due_idx ON tasks (due_date) WHERE notified = 0",
+    "CREATE INDEX IF NOT EXISTS tasks_due_idx ON tasks (due_date)",
+    "CREATE INDEX IF NOT EXISTS tasks_employee_due_idx ON tasks (employee_id, due_date) WHERE status != 'completed'",
+    "CREATE INDEX IF NOT EXISTS tasks_project_due_idx ON tasks (project_id, due_date) WHERE status != 'completed'",
+    "CREATE INDEX IF NOT EXISTS notes_project_idx ON notes (project_id)",
+    "CREATE INDEX IF NOT EXISTS notes_employee_idx ON notes (employee_id)",
+    "CREATE INDEX IF NOT EXISTS events_project_idx ON events (project_id)",
+    "CREATE INDEX IF NOT EXISTS events_employee_idx ON events (employee_id)",
+    "CREATE INDEX IF NOT EXISTS events_window_idx ON events (recurrence_end, due_date)",
+    "CREATE INDEX IF NOT EXISTS reminders_project_idx ON reminders (project_id)",
+    "CREATE INDEX IF NOT EXISTS reminders_employee_idx ON reminders (employee_id)",
+    "CREATE INDEX IF NOT EXISTS reminders_pending_due_idx ON reminders (due_date) WHERE notified = 0 AND status = 0",
+    "CREATE INDEX IF NOT EXISTS reminders_due_idx ON reminders (due_date)",
+    "CREATE INDEX IF NOT EXISTS files_project_idx ON files (project_id)",
+    "CREATE INDEX IF NOT EXISTS files_path_idx ON files (file_path)",
+    "CREATE INDEX IF NOT EXISTS folders_title_idx ON folders (title)",
+    "CREATE INDEX IF NOT EXISTS activity_project_idx ON activity (project_id, id)",
+    "CREATE INDEX IF NOT EXISTS activity_employee_idx ON activity (employee_id, id)",
+    "CREATE INDEX IF NOT EXISTS idempotency_keys_created_idx ON idempotency_keys (created_at)",
+]
+
+SQL_TYPES = {"text": "TEXT", "integer": "INTEGER", "bool": "INTEGER", "json": "TEXT"}
+
+
+def _workload_upsert(table: str, row: str, sign: str, grouped: bool = False) -> List[str]:
+    """Adds the contributions of `row` to the counters of its employee and project, once per entity."""
+    statements = []
+    counters = WORKLOAD_CONTRIBUTIONS[table]
+    for kind, column in WORKLOAD_ENTITIES.items():
+        entity = f"{row}.{column}"
+        if grouped:
+            values = ", ".join(f"{sign}SUM({expression.format(row=row)})" for expression in counters.values())
+            source = f"FROM {table} WHERE {entity} IS NOT NULL AND {entity} != '' GROUP BY {entity}"
+        else:
+            values = ", ".join(f"{sign}({expression.format(row=row)})" for expression in counters.values())
+            source = f"WHERE {entity} IS NOT NULL AND {entity} != ''"
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in counters)
+        statements.append(
+            f"INSERT INTO workload_counters (id, {', '.join(counters)}) "
+            f"SELECT '{kind}:' || {entity}, {values} {source} "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}"
+        )
+    return statements
+
+
+def _workload_triggers() -> List[str]:
+    """Triggers keeping workload_counters up to date, so every process writing the file shares the stats."""
+    statements = []
+    for table in WORKLOAD_CONTRIBUTIONS:
+        bodies = {
+            "INSERT": _workload_upsert(table, "NEW", ""),
+            "DELETE": _workload_upsert(table, "OLD", "-"),
+            "UPDATE": _workload_upsert(table, "OLD", "-") + _workload_upsert(table, "NEW", ""),
+        }
+        for operation, body in bodies.items():
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_workload_{operation.lower()} AFTER {operation} ON {table} "
+                f"BEGIN {'; '.join(body)}; END"
+            )
+    return statements
+
+
+def _workload_backfill() -> List[str]:
+    """Counts the rows written before the triggers existed."""
+    return [statement for table in WORKLOAD_CONTRIBUTIONS
+            for statement in _workload_upsert(table, table, "", grouped=True)]
+
+
+def _schema() -> List[str]:
+    statements = []
+    for table, columns in TABLES.items():
+        primary_key = PRIMARY_KEYS.get(table, "id")
+        definitions = []
+        for column, column_type in columns.items():
+            definition = f"{column} {SQL_TYPES[column_type]}"
+            if column == primary_key:
+                definition += " PRIMARY KEY"
+            if (table, column) in DEFAULTS:
+                definition += f" NOT NULL DEFAULT {DEFAULTS[(table, column)]}"
+            definitions.append(definition)
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(definitions)})")
+    return statements + INDEXES + _workload_triggers()
+
+
+class SQLiteRepository(Repository):
+    """Repository backed by an embedded SQLite database, for single-node deployments and local runs.
+
+    Every thread gets its own connection in WAL mode, so reads running in worker
+    threads never block writers. SQL text depends only on the table and the filter
+    columns, so sqlite3's per-connection statement cache reuses prepared statements.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            counted = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'tasks_workload_insert'"
+            ).fetchone()
+            for statement in _schema():
+                connection.execute(statement)
+            if not counted:
+                for statement in _workload_backfill():
+                    connection.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, cached_statements=256)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _encode(table: str, column: str, value: Any) -> Any:
+        column_type = TABLES[table].get(column)
+        if value is None:
+            return None
+        if column_type == "json":
+            return json.dumps(value)
+        if column_type == "bool":
+            return int(bool(value))
+        return value
+
+    @staticmethod
+    def _decode(table: str, row: sqlite3.Row) -> Row:
+        columns = TABLES[table]
+        decoded = {}
+        for column in row.keys():
+            value = row[column]
+            column_type = columns.get(column)
+            if value is not None and column_type == "bool":
+                value = bool(value)
+            elif value is not None and column_type == "json":
+                value = json.loads(value)
+            decoded[column] = value
+        return decoded
+
+    def _where(self, table: str, eq=None, neq=None, gte=None, lte=None, gt=None,
+               lt=None) -> Tuple[str, List[Any]]:
+        clauses = []
+        params = []
+        for operator, filters in (("=", eq), ("!=", neq), (">=", gte), ("<=", lte), (">", gt), ("<", lt)):
+            for column, value in (filters or {}).items():
+                if column not in TABLES[table]:
+                    raise ValueError(f"Unknown column {table}.{column}")
+                if value is None and operator in ("=", "!="):
+                    clauses.append(f"{column} IS {'NOT ' if operator == '!=' else ''}NULL")
+                    continue
+                clauses.append(f"{column} {operator} ?")
+                params.append(self._encode(table, column, value))
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
+
+    def _execute(self, table: str, sql: str, params: List[Any]) -> List[Row]:
+        cursor = self._connection().execute(sql, params)
+        return [self._decode(table, row) for row in cursor.fetchall()]
+
+    def _columns(self, table: str, columns: str) -> str:
+        if columns == "*":
+            return "*"
+        names = [name.strip() for name in columns.split(",")]
+        for name in names:
+            if name not in TABLES[table]:
+                raise ValueError(f"Unknown column {table}.{name}")
+        return ", ".join(names)
+
+    def select(self, table, columns="*", *, eq=None, neq=None, gte=None, lte=None, gt=None, lt=None,
+               order=None, desc=False, limit=None):
+        where, params = self._where(table, eq, neq, gte, lte, gt, lt)
+        sql = f"SELECT {self._columns(table, columns)} FROM {table}{where}"
+        if order:
+            if order not in TABLES[table]:
+                raise ValueError(f"Unknown column {table}.{order}")
+            sql += f" ORDER BY {order}{' DESC' if desc else ''}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._execute(table, sql, params)
+
+    def count(self, table, *, eq=None, neq=None, gte=None, lte=None, lt=None):
+        where, params = self._where(table, eq, neq, gte, lte, lt=lt)
+        return self._connection().execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+    def bucket_by_day(self, table, column, start, end, *, columns="*", eq=None, top=3) -> Buckets:
+        # Grouped and ranked in SQL, so only the counts and the top rows of each day are read
+        where, params = self._where(table, eq=eq, gte={column: start}, lt={column: end})
+        day = f"substr({column}, 1, 10)"
+        sql = (
+            f"SELECT * FROM (SELECT {self._columns(table, columns)}, {day} AS bucket_day, "
+            f"COUNT(*) OVER (PARTITION BY {day}) AS bucket_count, "
+            f"ROW_NUMBER() OVER (PARTITION BY {day} ORDER BY {column}, id) AS bucket_rank "
+            f"FROM {table}{where}) WHERE bucket_rank <= ? ORDER BY bucket_day, bucket_rank"
+        )
+        buckets: Buckets = {}
+        for row in self._execute(table, sql, params + [top]):
+            bucket = buckets.setdefault(row.pop("bucket_day"), {"count": row.pop("bucket_count"), "items": []})
+            row.pop("bucket_count", None)
+            row.pop("bucket_rank")
+            bucket["items"].append(row)
+        return buckets
+
+    def _values(self, table: str, row: Row) -> Tuple[List[str], List[Any]]:
+        columns = list(row.keys())
+        for column in columns:
+            if column not in TABLES[table]:
+                raise ValueError(f"Unknown column {table}.{column}")
+        return columns, [self._encode(table, column, row[column]) for column in columns]
+
+    def insert(self, table, row):
+        columns, params = self._values(table, row)
+        placeholders = ", ".join("?" for _ in columns)
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) RETURNING *"
+        return self._execute(table, sql, params)
+
+    def insert_many(self, table, rows):
+        if not rows:
+            return []
+        columns, _ = self._values(table, dict.fromkeys(column for row in rows for column in row))
+        placeholders = ", ".join("?" for _ in columns)
+        params = [[self._encode(table, column, row.get(column)) for column in columns] for row in rows]
+        connection = self._connection()
+        # One transaction for the whole batch instead of one per row
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", params)
+        return rows
+
+    def upsert(self, table, row):
+        columns, params = self._values(table, row)
+        primary_key = PRIMARY_KEYS.get(table, "id")
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != primary_key)
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({primary_key}) DO UPDATE SET {updates} RETURNING *"
+        )
+        return self._execute(table, sql, params)
+
+    def update(self, table, data, *, eq=None, neq=None):
+        if not data:
+            return self.select(table, eq=eq, neq=neq)
+        columns, params = self._values(table, data)
+        where, where_params = self._where(table, eq, neq)
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        return self._execute(table, f"UPDATE {table} SET {assignments}{where} RETURNING *", params + where_params)
+
+    def delete(self, table, *, eq=None, lt=None):
+        where, params = self._where(table, eq, lt=lt)
+        return self._execute(table, f"DELETE FROM {table}{where} RETURNING *", params)
@@ -1,19 +1,112 @@
 import os
-from supabase import create_client
+from typing import Optional, TYPE_CHECKING
 from dotenv import load_dotenv
+from database.repository import Repository
+from services.resilience import Guard, AdaptiveLimiter, CircuitBreaker
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 10))
+SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY", 100))
+
+_client: Optional["Client"] = None
+
+def get_supabase_client() -> "Client":
+    """Returns the Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_KEY")
+
+        if not supabase_url or not supabase_key:
+            raise ValueError("Missing Supabase credentials. Please check your .env file.")
+
+        # Imported here, the supabase stack adds noticeably to startup time
+        from supabase import create_client, ClientOptions
+
+        _client = create_client(supabase_url, supabase_key, options=ClientOptions(
+            postgrest_client_timeout=SUPABASE_TIMEOUT
+        ))
+    return _client
+
+
+class SupabaseRepository(Repository):
+    """Repository backed by the Supabase REST API.
+
+    Requests go through a guard that sheds load when Supabase slows down or keeps
+    failing. Reads are retried on transient errors; writes are not, since a write
+    that timed out may still have been applied.
+    """
+
+    def __init__(self, client: "Client"):
+        self.client = client
+        self.guard = Guard(
+            "Supabase",
+            limiter=AdaptiveLimiter(initial=20, minimum=4, maximum=SUPABASE_MAX_CONCURRENCY, tolerance=3.0),
+            breaker=CircuitBreaker(threshold=5, reset_timeout=10),
+        )
+
+    def _execute(self, query, operation: str, retry: bool = False):
+        return self.guard.call(query.execute, retry=retry, operation=operation).data or []
+
+    @staticmethod
+    def _filter(query, eq=None, neq=None, gte=None, lte=None, gt=None, lt=None):
+        for column, value in (eq or {}).items():
+            query = query.is_(column, "null") if value is None else query.eq(column, value)
+        for column, value in (neq or {}).items():
+            query = query.not_.is_(column, "null") if value is None else query.neq(column, value)
+        for column, value in (gte or {}).items():
+            query = query.gte(column, value)
+        for column, value in (lte or {}).items():
+            query = query.lte(column, value)
+        for column, value in (gt or {}).items():
+            query = query.gt(column, value)
+        for column, value in (lt or {}).items():
+            query = query.lt(column, value)
+        return query
+
+    def select(self, table, columns="*", *, eq=None, neq=None, gte=None, lte=None, gt=None, lt=None,
+               order=None, desc=False, limit=None):
+        query = self._filter(self.client.table(table).select(columns), eq, neq, gte, lte, gt, lt)
+        if order:
+            query = query.order(order, desc=desc)
+        if limit is not None:
+            query = query.limit(limit)
+        # Lookups by id, pages and full lists take very different times
+        kind = "get" if eq and "id" in eq else "page" if limit is not None else "list"
+        return self._execute(query, f"{table}.{kind}", retry=True)
+
+    def count(self, table, *, eq=None, neq=None, gte=None, lte=None, lt=None):
+        # Counted by PostgREST, only the Content-Range header comes back
+        query = self._filter(self.client.table(table).select("id", count="exact", head=True), eq, neq, gte, lte, lt=lt)
+        return self.guard.call(query.execute, retry=True, operation=f"{table}.count").count or 0
+
+    def bucket_by_day(self, table, column, start, end, *, columns="*", eq=None, top=3):
+        # Grouped and ranked by the calendar_buckets function (see the README), one row per day comes back
+        params = {
+            "source": table, "date_column": column, "window_start": start, "window_end": end,
+            "item_columns": columns, "filters": eq or {}, "top": top,
+        }
+        rows = self._execute(self.client.rpc("calendar_buckets", params), f"{table}.buckets", retry=True)
+        return {row["day"]: {"count": row["count"], "items": row["items"]} for row in rows}
+
+    def insert(self, table, row):
+        return self._execute(self.client.table(table).insert(row), f"{table}.insert")
+
+    def insert_many(self, table, rows):
+        return self._execute(self.client.table(table).insert(rows), f"{table}.insert_many")
 
-if not supabase_url or not supabase_key:
-    raise ValueError("Missing Supabase credentials. Please check your .env file.")
+    def upsert(self, table, row):
+        return self._execute(self.client.table(table).upsert(row), f"{table}.upsert")
 
-supabase = create_client(supabase_url, supabase_key)
+    def update(self, table, data, *, eq=None, neq=None):
+        query = self._filter(self.client.table(table).update(data), eq, neq)
+        return self._execute(query, f"{table}.update")
 
-def get_supabase_client():
-    """Returns the initialized Supabase client."""
-    return supabase 
\ No newline at end of file
+    def delete(self, table, *, eq=None, lt=None):
+        query = self._filter(self.client.table(table).delete(), eq, lt=lt)
+        return self._execute(query, f"{table}.delete")
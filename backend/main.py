@@ -1,29 +1,64 @@
 import os
+import sys
+import hmac
 import json
+import math
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any, Union
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Request
+from datetime import datetime, date
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import uuid
-from supabase import create_client, Client
-from fastapi.responses import JSONResponse
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request as GoogleAuthRequest
-from google_auth_oauthlib.flow import InstalledAppFlow
+from fastapi.responses import JSONResponse, Response, ORJSONResponse, PlainTextResponse
 import io
 import pickle
+from services import previews, recurrence, calendar
+from services.scheduler import DueScheduler, ConnectionNotifier, WebhookNotifier, NotificationRelay, parse_due_date
+from services.rollups import RollupIndex, TableRollups
+from services.coalesce import SingleFlight
+from services.idempotency import IdempotencyMiddleware, MemoryIdempotencyStore, TableIdempotencyStore
+from services.compression import CompressionMiddleware
+from services.serialization import rows_response, columns
+from services.resilience import Guard, TokenBucket, AdaptiveLimiter, CircuitBreaker, Overloaded
+from services.profiling import ProfileStore, ProfilingMiddleware, PROFILING_TOKEN, create_executor
+from services.activity import ActivityFeed
+from database.repository import AsyncRepository, get_repository
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+# Number of server processes in production mode. Workers share nothing in memory,
+# so with more than one, state that must be consistent goes through the database.
+WORKERS = int(os.environ.get("WORKERS", 1))
+
+# Shared clients, created in the lifespan handler. The Google and Supabase
+# libraries are slow to import, so they are only imported when first needed.
+# Handlers await `db`, which runs each call in a worker thread; background
+# services and code already running in threads use `repository` directly.
+repository = None
+db = None
+drive_service = None
+drive_credentials = None
+drive_http = threading.local()
+
+# Drive allows only a few sustained writes per second per user, so bursts of
+# uploads are limited here instead of failing with quota errors
+DRIVE_WRITES_PER_SECOND = float(os.environ.get("DRIVE_WRITES_PER_SECOND", 3))
+DRIVE_BURST = int(os.environ.get("DRIVE_BURST", 10))
+DRIVE_MAX_CONCURRENCY = int(os.environ.get("DRIVE_MAX_CONCURRENCY", 16))
+DRIVE_TIMEOUT = float(os.environ.get("DRIVE_TIMEOUT", 60))
+drive_guard = Guard(
+    "Google Drive",
+    bucket=TokenBucket(DRIVE_WRITES_PER_SECOND, DRIVE_BURST),
+    limiter=AdaptiveLimiter(initial=4, minimum=2, maximum=DRIVE_MAX_CONCURRENCY, tolerance=4.0),
+    breaker=CircuitBreaker(threshold=5, reset_timeout=30),
+)
+# Threads for Drive calls, created by the lifespan handler
+drive_executor = None
 
 # Define Pydantic models
 class ProjectBase(BaseModel):
@@ -68,6 +103,8 @@ class EventBase(BaseModel):
     type: str
     project_id: Optional[str] = None
     employee_id: Optional[str] = None
+    rrule: Optional[str] = None
+    exdates: Optional[List[str]] = None
 
 class ReminderBase(BaseModel):
     id: Optional[str] = None
@@ -107,17 +144,120 @@ class FolderBase(BaseModel):
 class TaskStatusUpdate(BaseModel):
     status: str
 
-# Initialize FastAPI
-app = FastAPI()
+# Identical concurrent list queries share one backend call
+reads = SingleFlight()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Reminder and deadline scheduler. Only the worker that fires an item notifies,
+# so with several workers the websocket push is relayed to the others.
+connection_notifier = ConnectionNotifier()
+notification_relay = NotificationRelay(connection_notifier) if WORKERS > 1 else None
+scheduler = DueScheduler(notifiers=[notification_relay or connection_notifier])
+if os.environ.get("NOTIFY_WEBHOOK_URL"):
+    scheduler.add_notifier(WebhookNotifier(os.environ["NOTIFY_WEBHOOK_URL"]))
+
+# Per-employee and per-project workload counters. Workers share no memory, so with
+# several workers they are kept in the database by triggers instead
+rollups = TableRollups() if WORKERS > 1 else RollupIndex()
+
+# Per-day calendar buckets, cached per window
+calendar_cache = calendar.CalendarCache()
+
+# Feed of recent changes, written to the activity table in batches
+activity = ActivityFeed()
+
+# Recent request profiles, captured on demand
+profiles = ProfileStore()
+
+# Idempotency keys, shared through the database when a retry may reach another worker
+idempotency_store = TableIdempotencyStore() if WORKERS > 1 else MemoryIdempotencyStore()
+
+# Seconds between attempts of the startup stats rebuild while the database is unreachable
+ROLLUP_RETRY_SECONDS = 5
+
+async def build_rollups():
+    # Runs after startup, so the first request does not wait for the whole history to be read
+    while True:
+        try:
+            await rollups.rebuild(repository)
+            return
+        except Exception as e:
+            print(f"Stats rebuild failed, retrying in {ROLLUP_RETRY_SECONDS}s: {str(e)}")
+            await asyncio.sleep(ROLLUP_RETRY_SECONDS)
+
+async def workload_stats(kind: str, entity_id: str):
+    if not rollups.ready:
+        raise Overloaded("Stats", ROLLUP_RETRY_SECONDS)
+    return await rollups.read(kind, entity_id)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global db, repository, drive_executor
+    # asyncio.to_thread runs in the default executor; this one lets the profiler find its threads
+    asyncio.get_running_loop().set_default_executor(create_executor())
+    # No more threads than Drive calls the guard lets through at once
+    drive_executor = create_executor(DRIVE_MAX_CONCURRENCY, "drive")
+    repository = get_repository()
+    # Lists read before a write are not shared with requests made after it
+    db = AsyncRepository(repository, on_write=reads.forget)
+    # Only warm up Drive when saved credentials exist, the OAuth flow is interactive
+    if os.path.exists('token.pickle'):
+        get_drive_service()
+    idempotency_store.start(repository)
+    await scheduler.start(repository)
+    if notification_relay:
+        notification_relay.start(repository)
+    build_task = asyncio.create_task(build_rollups())
+    activity.start(repository)
+
+    yield
+
+    # The server has already drained in-flight requests, including their uploads
+    build_task.cancel()
+    await activity.stop()
+    await scheduler.stop()
+    if notification_relay:
+        await notification_relay.stop()
+    await previews.drain()
+    await asyncio.to_thread(previews.shutdown)
+    drive_executor.shutdown()
+
+router = APIRouter()
+
+def create_app() -> FastAPI:
+    """Builds the application. Connections are opened by the lifespan handler, not here."""
+    # Initialize FastAPI
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+    # Replay responses of retried create requests that carry an Idempotency-Key
+    app.add_middleware(IdempotencyMiddleware, store=idempotency_store)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Truncated-Series"],
+    )
+
+    # Compress JSON responses with brotli or gzip when the client accepts it
+    app.add_middleware(CompressionMiddleware)
+
+    # Profile requests sent with X-Profile-Token or picked by PROFILE_SAMPLE_RATE
+    app.add_middleware(ProfilingMiddleware, store=profiles)
+
+    app.add_exception_handler(Overloaded, overloaded_handler)
+    app.include_router(router)
+    return app
+
+async def overloaded_handler(request: Request, exc: Overloaded):
+    print(f"Rejected {request.method} {request.url.path}: {str(exc)}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
 # Helper functions
 def generate_id() -> str:
@@ -132,8 +272,22 @@ def convert_datetime_to_string(data: dict) -> dict:
             data[key] = value.isoformat()
     return data
 
-def upload_file(file: UploadFile, project_id: Optional[str] = None):
-    print(f"Uploading file to project: {project_id}")
+def set_recurrence_end(event_data: dict) -> dict:
+    try:
+        recurrence.validate(event_data)
+        event_data["recurrence_end"] = recurrence.recurrence_end(event_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid recurrence: {str(e)}")
+    return event_data
+
+def get_drive_service():
+    global drive_service, drive_credentials
+    if drive_service is not None:
+        return drive_service
+    from googleapiclient.discovery import build
+    from google.auth.transport.requests import Request as GoogleAuthRequest
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     # Setup Google Drive API
     SCOPES = ['https://www.googleapis.com/auth/drive']
     creds = None
@@ -153,14 +307,37 @@ def upload_file(file: UploadFile, project_id: Optional[str] = None):
         # Save credentials for future use
         with open('token.pickle', 'wb') as token:
             pickle.dump(creds, token)
-    # Build the Drive API client
-    drive_service = build('drive', 'v3', credentials=creds)
-    print(f"Drive service: {drive_service}")
+    # Build the Drive API client once, it refreshes its credentials by itself
+    drive_credentials = creds
+    drive_service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+    return drive_service
+
+async def run_drive(fn, *args):
+    """Runs a blocking Drive call on the Drive threads, so slow uploads never hold the threads of database calls."""
+    return await asyncio.get_running_loop().run_in_executor(drive_executor, fn, *args)
+
+def drive_execute(request, operation: str):
+    """Executes a Drive request through the rate limiter, concurrency limit and circuit breaker."""
+    # httplib2 connections are not thread safe, so every thread gets its own, with a timeout
+    http = getattr(drive_http, "http", None)
+    if http is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+
+        http = AuthorizedHttp(drive_credentials, http=httplib2.Http(timeout=DRIVE_TIMEOUT))
+        drive_http.http = http
+    return drive_guard.call(lambda: request.execute(http=http), operation=operation)
+
+def upload_file(file: UploadFile, project_id: Optional[str] = None):
+    from googleapiclient.http import MediaIoBaseUpload
+
+    print(f"Uploading file to project: {project_id}")
+    drive_service = get_drive_service()
 
     if project_id and project_id != "":
-        project_query = supabase.table("projects").select("*").eq("id", project_id).execute()
-        if project_query.data:
-            project_data = project_query.data[0]
+        project_rows = repository.select("projects", eq={"id": project_id})
+        if project_rows:
+            project_data = project_rows[0]
             project_name = project_data["title"]
     else:
         project_name = ""
@@ -182,7 +359,8 @@ def upload_file(file: UploadFile, project_id: Optional[str] = None):
     #     folder = drive_service.files().create(body=folder_metadata, fields='id').execute()
     #     folder_id = folder.get('id')
     # Upload file to the directory
-    file_content = io.BytesIO(file.file.read())
+    file_bytes = file.file.read()
+    file_content = io.BytesIO(file_bytes)
     print(f" read file content")
     # Create file metadata
     file_metadata = {
@@ -192,11 +370,12 @@ def upload_file(file: UploadFile, project_id: Optional[str] = None):
     # Upload the file
     media = MediaIoBaseUpload(file_content, mimetype=file.content_type, resumable=True)
     print(f" upload the file")
-    uploaded_file = drive_service.files().create(
+    # Upload time grows with the size, so uploads are compared within powers of two
+    uploaded_file = drive_execute(drive_service.files().create(
         body=file_metadata,
         media_body=media,
         fields='id'
-    ).execute()
+    ), f"upload.{len(file_bytes).bit_length()}")
     print(f" uploaded the file")
     file_id = uploaded_file.get('id')
     file_url = f"https://drive.google.com/file/d/{file_id}/view"
@@ -206,61 +385,53 @@ def upload_file(file: UploadFile, project_id: Optional[str] = None):
         "file_url": file_url,
         "project_name": project_name,
         "file_size": file.size,
-        "file_type": file.content_type
+        "file_type": file.content_type,
+        "content": file_bytes
     }
 
 def delete_file_from_drive(file_id: str):
-    # Setup Google Drive API
-    SCOPES = ['https://www.googleapis.com/auth/drive']
-    creds = None
-    
-    # Load saved credentials if they exist
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    
-    # If credentials don't exist or are invalid, get new ones
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            request = GoogleAuthRequest()
-            creds.refresh(request)
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-    drive_service = build('drive', 'v3', credentials=creds)
-    drive_service.files().delete(fileId=file_id).execute()
+    drive_service = get_drive_service()
+    drive_execute(drive_service.files().delete(fileId=file_id), "delete")
     print("File deleted successfully")
     return {"message": "File deleted successfully"}
 
 # API Routes
-@app.get("/")
+@router.get("/")
 def read_root():
     return {"message": "Welcome to Project Management API"}
 
+# Notifications
+@router.websocket("/ws/notifications")
+async def notifications_socket(websocket: WebSocket):
+    await connection_notifier.connect(websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        connection_notifier.disconnect(websocket)
+
 # Projects
-@app.get("/projects")
+@router.get("/projects")
 async def get_projects(status: Optional[str] = None):
-    query = supabase.table("projects").select("*")
+    filters = {}
     if status:
-        query = query.neq("status", status)
-    response = query.execute()
-    if response.data is None:
-        return []
-    return response.data
+        filters["status"] = status
+    rows = await reads.do(("projects", status), lambda: repository.select("projects", neq=filters))
+    return rows_response(rows)
 
-@app.get("/projects/{project_id}", response_model=ProjectBase)
+@router.get("/projects/{project_id}", response_model=ProjectBase)
 async def get_project(project_id: str):
-    query = supabase.table("projects").select("*").eq("id", project_id)
-    response = query.execute()
-    if not response.data:
+    rows = await db.select("projects", eq={"id": project_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="Project not found")
-    project_data = response.data[0]
+    project_data = rows[0]
     return project_data
 
-@app.post("/projects", response_model=ProjectBase)
+@router.get("/projects/{project_id}/stats")
+async def get_project_stats(project_id: str):
+    return await workload_stats("projects", project_id)
+
+@router.post("/projects", response_model=ProjectBase)
 async def create_project(project: ProjectBase):
     project_data = project.dict()
     
@@ -273,18 +444,19 @@ async def create_project(project: ProjectBase):
         project_data["start_date"] = None
     if project_data.get("end_date") == "":
         project_data["end_date"] = None
-    response = supabase.table("projects").insert(project_data).execute()
-    if not response.data:
+    rows = await db.insert("projects", project_data)
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to create project")
     
-    created_project = response.data[0]
+    created_project = rows[0]
+    activity.record("created", "projects", created_project)
     return created_project
 
-@app.put("/projects/{project_id}", response_model=ProjectBase)
+@router.put("/projects/{project_id}", response_model=ProjectBase)
 async def update_project(project_id: str, project: ProjectBase):
     # Verify the project exists
-    check_response = supabase.table("projects").select("*").eq("id", project_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("projects", eq={"id": project_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Project not found")
     
     project_data = project.dict(exclude_unset=True)
@@ -293,48 +465,48 @@ async def update_project(project_id: str, project: ProjectBase):
     if project_data.get("end_date") == "":
         project_data["end_date"] = None
     
-    response = supabase.table("projects").update(project_data).eq("id", project_id).execute()
-    if not response.data:
+    rows = await db.update("projects", project_data, eq={"id": project_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to update project")
     
-    updated_project = response.data[0]
+    updated_project = rows[0]
+    activity.record("updated", "projects", updated_project)
     return updated_project
 
-@app.delete("/projects/{project_id}")
+@router.delete("/projects/{project_id}")
 async def delete_project(project_id: str):
     # Verify the project exists
-    check_response = supabase.table("projects").select("*").eq("id", project_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("projects", eq={"id": project_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    response = supabase.table("projects").delete().eq("id", project_id).execute()
+    rows = await db.delete("projects", eq={"id": project_id})
+    activity.record("deleted", "projects", existing_rows[0])
     return {"message": "Project deleted successfully"}
 
 # Tasks
-@app.get("/tasks")
+@router.get("/tasks")
 async def get_tasks(project_id: Optional[str] = None, employee_id: Optional[str] = None):
-    query = supabase.table("tasks").select("*")
+    filters = {}
     
     if project_id:
-        query = query.eq("project_id", project_id)
+        filters["project_id"] = project_id
     
     if employee_id:
-        query = query.eq("employee_id", employee_id)
+        filters["employee_id"] = employee_id
 
-    response = query.execute()
-    if response.data is None:
-        return []
-    return response.data
+    rows = await reads.do(("tasks", project_id, employee_id), lambda: repository.select("tasks", eq=filters))
+    return rows_response(rows)
 
-@app.get("/tasks/{task_id}", response_model=TaskBase)
+@router.get("/tasks/{task_id}", response_model=TaskBase)
 async def get_task(task_id: str):
-    response = supabase.table("tasks").select("*").eq("id", task_id).execute()
-    if not response.data:
+    rows = await db.select("tasks", eq={"id": task_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="Task not found")
-    task_data = response.data[0]
+    task_data = rows[0]
     return task_data
 
-@app.post("/tasks", response_model=TaskBase)
+@router.post("/tasks", response_model=TaskBase)
 async def create_task(
     title: str = Form(...),
     status: str = Form(...),
@@ -361,18 +533,25 @@ async def create_task(
         "file_id": None
     }
     
+    # Fail before creating the task while Drive is refusing uploads
+    if file and file.filename:
+        drive_guard.check()
+
     # Insert task first to get the task_id
-    response = supabase.table("tasks").insert(task_data).execute()
-    if not response.data:
+    rows = await db.insert("tasks", task_data)
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to create task")
     
-    created_task = response.data[0]
+    created_task = rows[0]
+    scheduler.track("tasks", created_task)
+    rollups.apply("tasks", created_task)
+    calendar_cache.invalidate(created_task)
     # Handle file upload if provided
     if file and file.filename:
         try:
-            upload_result = upload_file(file, project_id=project_id)
+            upload_result = await run_drive(upload_file, file, project_id)
             # Update the task with the file URL
-            supabase.table("tasks").update({"file_id": upload_result["file_id"]}).eq("id", created_task["id"]).execute()
+            await db.update("tasks", {"file_id": upload_result["file_id"]}, eq={"id": created_task["id"]})
             file_data = {
                 "id": upload_result['file_id'],
                 "title": file.filename,
@@ -384,27 +563,36 @@ async def create_task(
                 "folder_id": project_id,
                 "created_at": get_current_timestamp()
             }
-            response = supabase.table("files").insert(file_data).execute()
-            if not response.data:
+            rows = await db.insert("files", file_data)
+            if not rows:
                 raise HTTPException(status_code=400, detail="Failed to create file")
-            projects = supabase.table("projects").select("*").eq("id", project_id).execute()
+            previews.schedule(repository, upload_result['file_id'], upload_result['content'], file.content_type, file.filename)
+            projects = await db.select("projects", eq={"id": project_id})
             folder_data = {
                 "id": project_id,
-                "title": projects.data[0]["title"],
+                "title": projects[0]["title"],
                 "parent": "root",
             }
-            check_folder = supabase.table("folders").select("*").eq("title", projects.data[0]["title"]).execute()
-            if not check_folder.data:
-                response = supabase.table("folders").insert(folder_data).execute()
+            check_folder = await db.select("folders", eq={"title": projects[0]["title"]})
+            if not check_folder:
+                rows = await db.insert("folders", folder_data)
+        except Overloaded:
+            # The client is told to retry the whole request, so the task is not kept
+            await db.delete("tasks", eq={"id": created_task["id"]})
+            scheduler.cancel("tasks", created_task["id"])
+            rollups.remove("tasks", created_task["id"])
+            calendar_cache.invalidate(created_task)
+            raise
         except Exception as e:
             # Log the error but don't fail the request
             print(f"File upload failed: {str(e)}")
             # Update the error message in the response
             created_task["file_upload_error"] = str(e)
     
+    activity.record("created", "tasks", created_task)
     return created_task
 
-@app.put("/tasks/{task_id}")
+@router.put("/tasks/{task_id}")
 async def update_task(
     task_id: str,
     title: Optional[str] = Form(None),
@@ -418,8 +606,8 @@ async def update_task(
     file: Optional[UploadFile] = File(None)
 ):
     # Verify the task exists
-    check_response = supabase.table("tasks").select("*").eq("id", task_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("tasks", eq={"id": task_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Task not found")
     
     # Build update data from form fields
@@ -434,6 +622,9 @@ async def update_task(
         task_data["priority"] = priority
     if due_date is not None:
         task_data["due_date"] = due_date
+        # Forms resend the due date, only a new one makes a fired deadline due again
+        if parse_due_date(due_date) != parse_due_date(existing_rows[0].get("due_date")):
+            task_data["notified"] = False
     if project_id is not None:
         task_data["project_id"] = project_id
     if description is not None:
@@ -444,16 +635,22 @@ async def update_task(
     # Handle file upload if provided
     if file and file.filename:
         try:
-            upload_result = upload_file(file, project_id=project_id)
+            upload_result = await run_drive(upload_file, file, project_id)
             task_data["file"] = upload_result["file_url"]
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"File upload failed: {str(e)}")
     
-    response = supabase.table("tasks").update(task_data).eq("id", task_id).execute()
-    if not response.data:
+    rows = await db.update("tasks", task_data, eq={"id": task_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to update task")
     
-    updated_task = response.data[0]
+    updated_task = rows[0]
+    scheduler.track("tasks", updated_task)
+    rollups.apply("tasks", updated_task)
+    calendar_cache.invalidate(existing_rows[0], updated_task)
+    activity.record("updated", "tasks", updated_task)
     
     # If file upload failed, add error message to response
     if file and file.filename and "file_id" not in task_data:
@@ -461,64 +658,71 @@ async def update_task(
     
     return updated_task
 
-@app.put("/tasks/{task_id}/status")
+@router.put("/tasks/{task_id}/status")
 async def update_task_status(task_id: str, task_status: TaskStatusUpdate):
     # Verify the task exists
-    check_response = supabase.table("tasks").select("*").eq("id", task_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("tasks", eq={"id": task_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Task not found")
     
     update_data = {
         "status": task_status.status,
     }
-    response = supabase.table("tasks").update(update_data).eq("id", task_id).execute()
-    if not response.data:
+    rows = await db.update("tasks", update_data, eq={"id": task_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to update task status")
     
-    updated_task = response.data[0]
+    updated_task = rows[0]
+    scheduler.track("tasks", updated_task)
+    rollups.apply("tasks", updated_task)
+    calendar_cache.invalidate(existing_rows[0], updated_task)
+    activity.record("updated", "tasks", updated_task)
     return updated_task
 
-@app.delete("/tasks/{task_id}")
+@router.delete("/tasks/{task_id}")
 async def delete_task(task_id: str):
     # Verify the task exists
-    check_response = supabase.table("tasks").select("*").eq("id", task_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("tasks", eq={"id": task_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Task not found")
     #delete the file from drive
-    file_id = check_response.data[0]["file_id"]
+    file_id = existing_rows[0]["file_id"]
     if file_id and file_id != "":
-        delete_file_from_drive(file_id)
-        supabase.table("files").delete().eq("id", file_id).execute()
+        await run_drive(delete_file_from_drive, file_id)
+        await db.delete("files", eq={"id": file_id})
+        await previews.discard(repository, file_id)
     #delete the file from supabase
-    response = supabase.table("tasks").delete().eq("id", task_id).execute()
-    if not response.data:
+    rows = await db.delete("tasks", eq={"id": task_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to delete task")
+    scheduler.cancel("tasks", task_id)
+    rollups.remove("tasks", task_id)
+    calendar_cache.invalidate(existing_rows[0])
+    activity.record("deleted", "tasks", existing_rows[0])
     return {"message": "Task deleted successfully"}
 
 # Notes
-@app.get("/notes")
+@router.get("/notes")
 async def get_notes(project_id: Optional[str] = None, employee_id: Optional[str] = None):
-    query = supabase.table("notes").select("*")
+    filters = {}
     
     if project_id:
-        query = query.eq("project_id", project_id)
+        filters["project_id"] = project_id
     if employee_id:
-        query = query.eq("employee_id", employee_id)
+        filters["employee_id"] = employee_id
     
-    response = query.execute()
-    if response.data is None:
-        return []
-    return response.data
+    rows = await reads.do(("notes", project_id, employee_id), lambda: repository.select("notes", eq=filters))
+    return rows_response(rows)
 
-@app.get("/notes/{note_id}", response_model=NoteBase)
+@router.get("/notes/{note_id}", response_model=NoteBase)
 async def get_note(note_id: str):
-    response = supabase.table("notes").select("*").eq("id", note_id).execute()
-    if not response.data:
+    rows = await db.select("notes", eq={"id": note_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="Note not found")
-    note_data = response.data[0]
+    note_data = rows[0]
     return note_data
 
-@app.post("/notes", response_model=NoteBase)
+@router.post("/notes", response_model=NoteBase)
 async def create_note(
     title: str = Form(...),
     description: Optional[str] = Form(None),
@@ -540,7 +744,7 @@ async def create_note(
     # Handle file upload if provided
     if file and file.filename:
         try:
-            upload_result = upload_file(file=file, project_id=project_id)
+            upload_result = await run_drive(upload_file, file, project_id)
             
             file_data = {
                 "id": upload_result['file_id'],
@@ -558,23 +762,26 @@ async def create_note(
             # Update the note with the file URL
             if upload_result['file_url']:
                 note_data['file_url'] = upload_result['file_url']
-                response = supabase.table("notes").insert(note_data).execute()
-                if not response.data:
+                rows = await db.insert("notes", note_data)
+                if not rows:
                     raise HTTPException(status_code=400, detail="Failed to create note")
                 
-                response_file = supabase.table("files").insert(file_data).execute()
-                if not response_file.data:
+                file_rows = await db.insert("files", file_data)
+                if not file_rows:
                     raise HTTPException(status_code=400, detail="Failed to create file")
+                previews.schedule(repository, upload_result['file_id'], upload_result['content'], file.content_type, file.filename)
                 
-                projects = supabase.table("projects").select("*").eq("id", project_id).execute()
+                projects = await db.select("projects", eq={"id": project_id})
                 folder_data = {
                     "id": project_id,
-                    "title": projects.data[0]["title"],
+                    "title": projects[0]["title"],
                     "parent": "root",
                 }
-                check_folder = supabase.table("folders").select("*").eq("title", projects.data[0]["title"]).execute()
-                if not check_folder.data:
-                    response = supabase.table("folders").insert(folder_data).execute()
+                check_folder = await db.select("folders", eq={"title": projects[0]["title"]})
+                if not check_folder:
+                    rows = await db.insert("folders", folder_data)
+        except Overloaded:
+            raise
         except Exception as e:
             # Log the error but don't fail the request
             print(f"File upload failed: {str(e)}")
@@ -583,14 +790,16 @@ async def create_note(
             raise HTTPException(status_code=400, detail="Failed to create note")
     else:
         # No file upload, just create the note
-        response = supabase.table("notes").insert(note_data).execute()
-        if not response.data:
+        rows = await db.insert("notes", note_data)
+        if not rows:
             raise HTTPException(status_code=400, detail="Failed to create note")
-        note_data = response.data[0]  # Get the full note data from the database
+        note_data = rows[0]  # Get the full note data from the database
     
+    rollups.apply("notes", note_data)
+    activity.record("created", "notes", note_data)
     return note_data
 
-@app.put("/notes/{note_id}", response_model=NoteBase)
+@router.put("/notes/{note_id}", response_model=NoteBase)
 async def update_note(
     note_id: str,
     title: Optional[str] = Form(None),
@@ -602,8 +811,8 @@ async def update_note(
     file: Optional[UploadFile] = File(None)
 ):
     # Verify the note exists
-    check_response = supabase.table("notes").select("*").eq("id", note_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("notes", eq={"id": note_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Note not found")
     
     # Build update data from form fields
@@ -624,7 +833,7 @@ async def update_note(
     # Handle file upload if provided
     if file and file.filename:
         try:
-            upload_result = upload_file(file, project_id=project_id)
+            upload_result = await run_drive(upload_file, file, project_id)
             note_data["file_url"] = upload_result["file_url"]
             
             # Create a file record in the database
@@ -640,10 +849,13 @@ async def update_note(
                 "created_at": get_current_timestamp()
             }
             
-            response_file = supabase.table("files").insert(file_data).execute()
-            if not response_file.data:
+            file_rows = await db.insert("files", file_data)
+            if not file_rows:
                 raise HTTPException(status_code=400, detail="Failed to create file")
+            previews.schedule(repository, upload_result['file_id'], upload_result['content'], file.content_type, file.filename)
                 
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"File upload failed: {str(e)}")
             # Don't update the file field if upload failed
@@ -654,75 +866,111 @@ async def update_note(
         try:
             file_url = note_data["file_url"]
             try:
-                delete_file_from_drive(file_url)
-                response_file = supabase.table("files").delete().eq("file_url", file_url).execute()
-                if not response_file.data:
+                await run_drive(delete_file_from_drive, file_url)
+                file_rows = await db.delete("files", eq={"file_url": file_url})
+                if not file_rows:
                     raise HTTPException(status_code=400, detail="Failed to delete file")
             except Exception as e:
                 print(f"File deletion failed: {str(e)}")
                 print(f"File deletion failed: {str(e)}")
         except Exception as e:  #delete the file from supabase
             print(f"File deletion failed: {str(e)}")
-        response = supabase.table("notes").update(note_data).eq("id", note_id).execute()
-        if not response.data:
+        rows = await db.update("notes", note_data, eq={"id": note_id})
+        if not rows:
             raise HTTPException(status_code=400, detail="Failed to update note")
-        updated_note = response.data[0]
+        updated_note = rows[0]
+        rollups.apply("notes", updated_note)
+        activity.record("updated", "notes", updated_note)
     else:
         # No changes to make
-        updated_note = check_response.data[0]
+        updated_note = existing_rows[0]
     
     return updated_note
 
-@app.delete("/notes/{note_id}")
+@router.delete("/notes/{note_id}")
 async def delete_note(note_id: str):
     # Verify the note exists
-    check_response = supabase.table("notes").select("*").eq("id", note_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("notes", eq={"id": note_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Note not found")
     
     # Delete the file from Google Drive
     try:
-        file_url = check_response.data[0]["file_url"]
+        file_url = existing_rows[0]["file_url"]
         if file_url:
-            file_id = supabase.table("files").select("*").eq("file_path", file_url).execute().data[0]["id"]
+            file_id = (await db.select("files", eq={"file_path": file_url}))[0]["id"]
             if file_id and file_id != "":
-                delete_file_from_drive(file_id)
-                response_file = supabase.table("files").delete().eq("id", file_id).execute()
-                if not response_file.data:
+                await run_drive(delete_file_from_drive, file_id)
+                file_rows = await db.delete("files", eq={"id": file_id})
+                if not file_rows:
                     raise HTTPException(status_code=400, detail="Failed to delete file")
-            response = supabase.table("notes").delete().eq("id", note_id).execute()
-            if not response.data:
+                await previews.discard(repository, file_id)
+            rows = await db.delete("notes", eq={"id": note_id})
+            if not rows:
                 raise HTTPException(status_code=400, detail="Failed to delete note")
+            rollups.remove("notes", note_id)
+            activity.record("deleted", "notes", existing_rows[0])
             return {"message": "Note deleted successfully"}
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"File deletion failed: {str(e)}")
     #delete the note from supabase
 
 # Events
-@app.get("/events")
-async def get_events(project_id: Optional[str] = None, employee_id: Optional[str] = None):
-    query = supabase.table("events").select("*")
+@router.get("/events")
+async def get_events(
+    project_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to")
+):
+    filters = {}
     
     if project_id:
-        query = query.eq("project_id", project_id)
+        filters["project_id"] = project_id
     
     if employee_id:
-        query = query.eq("employee_id", employee_id)
+        filters["employee_id"] = employee_id
+    
+    if from_date is None and to_date is None:
+        rows = await reads.do(("events", project_id, employee_id), lambda: repository.select("events", eq=filters))
+        return rows_response(rows)
+    
+    if from_date is None or to_date is None:
+        raise HTTPException(status_code=400, detail="Both from and to are required")
     
-    response = query.execute()
-    if response.data is None:
-        return []
-    return response.data
+    # One-off events and series both overlap the window when they start before
+    # its end and their last occurrence is after its start
+    rows = await reads.do(
+        ("events", project_id, employee_id, from_date, to_date),
+        lambda: repository.select(
+            "events",
+            eq=filters,
+            lte={"due_date": to_date.isoformat()},
+            gte={"recurrence_end": from_date.isoformat()}
+        )
+    )
+    try:
+        occurrences, truncated = await asyncio.to_thread(recurrence.expand_all, rows, from_date, to_date)
+    except recurrence.ExpansionError as e:
+        raise HTTPException(status_code=400, detail=f"Window too far from the start of a series: {str(e)}")
+    occurrences.sort(key=lambda event: str(event["due_date"]))
+    response = rows_response(occurrences)
+    if truncated:
+        # Only the first recurrence.MAX_WINDOW_OCCURRENCES occurrences of these series are returned
+        response.headers["X-Truncated-Series"] = ",".join(truncated)
+    return response
 
-@app.get("/events/{event_id}", response_model=EventBase)
+@router.get("/events/{event_id}", response_model=EventBase)
 async def get_event(event_id: str):
-    response = supabase.table("events").select("*").eq("id", event_id).execute()
-    if not response.data:
+    rows = await db.select("events", eq={"id": event_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="Event not found")
-    event_data = response.data[0]
+    event_data = rows[0]
     return event_data
 
-@app.post("/events", response_model=EventBase)
+@router.post("/events", response_model=EventBase)
 async def create_event(event: EventBase):
     event_data = event.dict()
     
@@ -730,129 +978,178 @@ async def create_event(event: EventBase):
         event_data["id"] = generate_id()
     
     event_data = convert_datetime_to_string(event_data)
+    event_data = set_recurrence_end(event_data)
     
-    response = supabase.table("events").insert(event_data).execute()
-    if not response.data:
+    rows = await db.insert("events", event_data)
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to create event")
     
-    created_event = response.data[0]
+    created_event = rows[0]
+    rollups.apply("events", created_event)
+    calendar_cache.invalidate(created_event)
+    activity.record("created", "events", created_event)
     return created_event
 
-@app.put("/events/{event_id}", response_model=EventBase)
+@router.put("/events/{event_id}", response_model=EventBase)
 async def update_event(event_id: str, event: EventBase):
     # Verify the event exists
-    check_response = supabase.table("events").select("*").eq("id", event_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("events", eq={"id": event_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Event not found")
     event_data = convert_datetime_to_string(event.dict(exclude_unset=True))
-    response = supabase.table("events").update(event_data).eq("id", event_id).execute()
-    if not response.data:
+    if {"due_date", "rrule", "exdates"} & event_data.keys():
+        merged_event = set_recurrence_end({**existing_rows[0], **event_data})
+        event_data["recurrence_end"] = merged_event["recurrence_end"]
+    rows = await db.update("events", event_data, eq={"id": event_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to update event")
+    recurrence.invalidate(event_id)
     
-    updated_event = response.data[0]
+    updated_event = rows[0]
+    rollups.apply("events", updated_event)
+    calendar_cache.invalidate(existing_rows[0], updated_event)
+    activity.record("updated", "events", updated_event)
     return updated_event
 
-@app.delete("/events/{event_id}")
+@router.delete("/events/{event_id}")
 async def delete_event(event_id: str):
     # Verify the event exists
-    check_response = supabase.table("events").select("*").eq("id", event_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("events", eq={"id": event_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    response = supabase.table("events").delete().eq("id", event_id).execute()
+    rows = await db.delete("events", eq={"id": event_id})
+    recurrence.invalidate(event_id)
+    rollups.remove("events", event_id)
+    calendar_cache.invalidate(existing_rows[0])
+    activity.record("deleted", "events", existing_rows[0])
     return {"message": "Event deleted successfully"}
 
 # Reminders
-@app.get("/reminders")
+@router.get("/reminders")
 async def get_reminders(project_id: Optional[str] = None, employee_id: Optional[str] = None, status: Optional[str] = None):
-    query = supabase.table("reminders").select("*")
+    filters = {}
     
     if project_id:
-        query = query.eq("project_id", project_id)
+        filters["project_id"] = project_id
     if employee_id:
-        query = query.eq("employee_id", employee_id)
+        filters["employee_id"] = employee_id
     if status:
         if status == "false":
-            query = query.eq("status", False)
+            filters["status"] = False
         else:
-            query = query.eq("status", True)
+            filters["status"] = True
     
-    response = query.execute()
-    if response.data is None:
-        return []
-    return response.data
+    rows = await reads.do(("reminders", project_id, employee_id, status), lambda: repository.select("reminders", eq=filters))
+    return rows_response(rows)
 
-@app.get("/reminders/{reminder_id}", response_model=ReminderBase)
+@router.get("/reminders/{reminder_id}", response_model=ReminderBase)
 async def get_reminder(reminder_id: str):
-    response = supabase.table("reminders").select("*").eq("id", reminder_id).execute()
-    if not response.data:
+    rows = await db.select("reminders", eq={"id": reminder_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="Reminder not found")
-    reminder_data = response.data[0]
+    reminder_data = rows[0]
     return reminder_data
 
-@app.post("/reminders", response_model=ReminderBase)
+@router.post("/reminders", response_model=ReminderBase)
 async def create_reminder(reminder: ReminderBase):
     reminder_data = reminder.dict()
     
     if not reminder_data.get("id"):
         reminder_data["id"] = generate_id()
     
-    response = supabase.table("reminders").insert(reminder_data).execute()
-    if not response.data:
+    rows = await db.insert("reminders", reminder_data)
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to create reminder")
     
-    created_reminder = response.data[0]
+    created_reminder = rows[0]
+    scheduler.track("reminders", created_reminder)
+    rollups.apply("reminders", created_reminder)
+    calendar_cache.invalidate(created_reminder)
+    activity.record("created", "reminders", created_reminder)
     return created_reminder
 
-@app.put("/reminders/{reminder_id}", response_model=ReminderBase)
+@router.put("/reminders/{reminder_id}", response_model=ReminderBase)
 async def update_reminder(reminder_id: str, reminder: ReminderBase):
     # Verify the reminder exists
-    check_response = supabase.table("reminders").select("*").eq("id", reminder_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("reminders", eq={"id": reminder_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
     reminder_data = reminder.dict(exclude_unset=True)
+    # due_date is sent on every update, only a new one makes a fired reminder due again
+    if parse_due_date(reminder_data.get("due_date")) != parse_due_date(existing_rows[0].get("due_date")):
+        reminder_data["notified"] = False
     
-    response = supabase.table("reminders").update(reminder_data).eq("id", reminder_id).execute()
-    if not response.data:
+    rows = await db.update("reminders", reminder_data, eq={"id": reminder_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to update reminder")
     
-    updated_reminder = response.data[0]
+    updated_reminder = rows[0]
+    scheduler.track("reminders", updated_reminder)
+    rollups.apply("reminders", updated_reminder)
+    calendar_cache.invalidate(existing_rows[0], updated_reminder)
+    activity.record("updated", "reminders", updated_reminder)
     return updated_reminder
 
-@app.delete("/reminders/{reminder_id}")
+@router.delete("/reminders/{reminder_id}")
 async def delete_reminder(reminder_id: str):
     # Verify the reminder exists
-    check_response = supabase.table("reminders").select("*").eq("id", reminder_id).execute()
-    if not check_response.data:
+    existing_rows = await db.select("reminders", eq={"id": reminder_id})
+    if not existing_rows:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
-    response = supabase.table("reminders").delete().eq("id", reminder_id).execute()
+    rows = await db.delete("reminders", eq={"id": reminder_id})
+    scheduler.cancel("reminders", reminder_id)
+    rollups.remove("reminders", reminder_id)
+    calendar_cache.invalidate(existing_rows[0])
+    activity.record("deleted", "reminders", existing_rows[0])
     return {"message": "Reminder deleted successfully"}
 
 # Files
-@app.get("/files", response_model=List[FileBase])
+@router.get("/files", response_model=List[FileBase])
 async def get_files(project_id: Optional[str] = None):
-    query = supabase.table("files").select("*")
+    filters = {}
     
     if project_id:
-        query = query.eq("project_id", project_id)
+        filters["project_id"] = project_id
     
-    response = query.execute()
+    # Only the FileBase columns are selected, so the rows can skip response validation
+    rows = await reads.do(("files", project_id), lambda: repository.select("files", columns(FileBase), eq=filters))
     
-    if response.data is None:
-        return []
-    return response.data
+    return rows_response(rows)
 
-@app.get("/files/{file_id}", response_model=FileBase)
+@router.get("/files/{file_id}", response_model=FileBase)
 async def get_file(file_id: str):
-    response = supabase.table("files").select("*").eq("id", file_id).execute()
-    if not response.data:
+    rows = await db.select("files", eq={"id": file_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="File not found")
-    file_data = response.data[0]
+    file_data = rows[0]
     return file_data
 
-@app.post("/files", response_model=FileBase)
+@router.get("/files/{file_id}/thumbnail")
+async def get_file_thumbnail(file_id: str):
+    preview = await previews.get_preview(repository, file_id)
+    if not preview or not preview["thumbnail"]:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return Response(
+        content=preview["thumbnail"],
+        media_type=preview["mime_type"],
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+@router.get("/files/{file_id}/preview")
+async def get_file_preview(file_id: str):
+    preview = await previews.get_preview(repository, file_id)
+    if not preview:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    return {
+        "file_id": file_id,
+        "thumbnail_url": f"/files/{file_id}/thumbnail" if preview["thumbnail"] else None,
+        "preview_text": preview["preview_text"]
+    }
+
+@router.post("/files", response_model=FileBase)
 async def create_file(folder_id: str = Form(...),
     project_id: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
@@ -860,7 +1157,7 @@ async def create_file(folder_id: str = Form(...),
     file: UploadFile = File(...),
     category: Optional[str] = Form(None),
 ):
-    upload_result = upload_file(file, project_id=project_id)
+    upload_result = await run_drive(upload_file, file, project_id)
     file_data = {
         "id": upload_result['file_id'],
         "title": file.filename,
@@ -882,75 +1179,191 @@ async def create_file(folder_id: str = Form(...),
     if file_data.get("file_size") is None:
         file_data["file_size"] = "0"
     
-    response = supabase.table("files").insert(file_data).execute()
-    if not response.data:
+    rows = await db.insert("files", file_data)
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to create file")
     
-    created_file = response.data[0]
+    created_file = rows[0]
+    previews.schedule(repository, created_file["id"], upload_result['content'], file.content_type, file.filename)
+    activity.record("created", "files", created_file)
     return created_file
 
-@app.delete("/files/{file_id}")
+@router.delete("/files/{file_id}")
 async def delete_file(file_id: str):
     # Get file info
-    delete_file_from_drive(file_id)
-    check_response = supabase.table("files").delete().eq("id", file_id).execute()
-    if not check_response.data:
+    await run_drive(delete_file_from_drive, file_id)
+    rows = await db.delete("files", eq={"id": file_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="File not found")
+    await previews.discard(repository, file_id)
+    activity.record("deleted", "files", rows[0])
     return {"message": "File deleted successfully"}
 
 # Employees
 # Get all employees
-@app.get("/employees", response_model=List[EmployeeBase])
+@router.get("/employees", response_model=List[EmployeeBase])
 async def get_employees():
-    response = supabase.table("employees").select("*").execute()
-    return response.data
+    rows = await reads.do(("employees",), lambda: repository.select("employees", columns(EmployeeBase)))
+    return rows_response(rows)
 
 # Get employee by ID
-@app.get("/employees/{employee_id}", response_model=EmployeeBase)
+@router.get("/employees/{employee_id}", response_model=EmployeeBase)
 async def get_employee(employee_id: str):
-    response = supabase.table("employees").select("*").eq("id", employee_id).execute()
-    if not response.data:
+    rows = await db.select("employees", eq={"id": employee_id})
+    if not rows:
         raise HTTPException(status_code=404, detail="Employee not found")
-    employee_data = response.data[0]
+    employee_data = rows[0]
     return employee_data
 
+@router.get("/employees/{employee_id}/stats")
+async def get_employee_stats(employee_id: str):
+    return await workload_stats("employees", employee_id)
+
 # Create employee
-@app.post("/employees", response_model=EmployeeBase)
+@router.post("/employees", response_model=EmployeeBase)
 async def create_employee(employee: EmployeeBase):
     employee.id = generate_id()
-    response = supabase.table("employees").insert(employee.dict()).execute()
-    return response.data[0]
+    rows = await db.insert("employees", employee.dict())
+    activity.record("created", "employees", rows[0])
+    return rows[0]
 
 # Update employee
-@app.put("/employees/{employee_id}", response_model=EmployeeBase)
+@router.put("/employees/{employee_id}", response_model=EmployeeBase)
 async def update_employee(employee_id: str, employee: EmployeeBase):
-    response = supabase.table("employees").update(employee.dict()).eq("id", employee_id).execute()
-    if not response.data:
+    rows = await db.update("employees", employee.dict(), eq={"id": employee_id})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to update employee")
-    updated_employee = response.data[0]
+    updated_employee = rows[0]
+    activity.record("updated", "employees", updated_employee)
     return updated_employee
 
 # Delete employee
-@app.delete("/employees/{employee_id}")
+@router.delete("/employees/{employee_id}")
 async def delete_employee(employee_id: str):
-    response = supabase.table("employees").delete().eq("id", employee_id).execute()
+    rows = await db.delete("employees", eq={"id": employee_id})
+    for row in rows:
+        activity.record("deleted", "employees", row)
     return {"message": "Employee deleted successfully"}
 
+# Calendar
+@router.get("/calendar")
+async def get_calendar(
+    view: str = "month",
+    day: Optional[date] = Query(None, alias="date"),
+    project_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    top: int = Query(3, ge=1, le=20)
+):
+    try:
+        start, end = calendar.window(view, day or date.today())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = {}
+    if project_id:
+        filters["project_id"] = project_id
+    if employee_id:
+        filters["employee_id"] = employee_id
+    
+    key = (start.isoformat(), end.isoformat(), project_id, employee_id, top)
+    result = calendar_cache.get(key)
+    if result is None:
+        generation = calendar_cache.generation
+        # A build started before a change must not be shared with requests made after it
+        try:
+            result = await reads.do(("calendar", generation) + key, lambda: calendar.build(repository, start, end, filters, top))
+        except recurrence.ExpansionError as e:
+            raise HTTPException(status_code=400, detail=f"Window too far from the start of a series: {str(e)}")
+        calendar_cache.set(key, result, generation)
+    return {"view": view, **result}
+
+# Activity
+@router.get("/activity")
+async def get_activity(
+    project_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    entity: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    filters = {}
+    if project_id:
+        filters["project_id"] = project_id
+    if employee_id:
+        filters["employee_id"] = employee_id
+    if entity:
+        filters["entity"] = entity
+    
+    # Keyset pagination on the time-ordered id: each page starts below the last id of the previous one
+    rows = await reads.do(
+        ("activity", project_id, employee_id, entity, before, limit),
+        lambda: repository.select(
+            "activity",
+            eq=filters,
+            lt={"id": before} if before else None,
+            order="id",
+            desc=True,
+            limit=limit
+        )
+    )
+    items = activity.merge(rows, limit, before, filters)
+    return {"items": items, "next": items[-1]["id"] if len(items) == limit else None}
+
+# Profiling
+def check_profiling_token(x_profile_token: Optional[str] = Header(None)):
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not hmac.compare_digest((x_profile_token or "").encode(), PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+@router.get("/admin/profiles", dependencies=[Depends(check_profiling_token)])
+async def get_profiles():
+    return profiles.list()
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(check_profiling_token)])
+async def get_profile(profile_id: str):
+    capture = profiles.get(profile_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(capture["folded"])
+
+# Stats
+@router.post("/stats/rebuild")
+async def rebuild_stats():
+    await rollups.rebuild(repository)
+    return {"message": "Stats rebuilt successfully"}
+
 # Folders
-@app.get("/folders", response_model=List[FolderBase])
+@router.get("/folders", response_model=List[FolderBase])
 async def get_folders():
-    response = supabase.table("folders").select("*").execute()
-    return response.data
+    rows = await reads.do(("folders",), lambda: repository.select("folders", columns(FolderBase)))
+    return rows_response(rows)
 
-@app.post("/folders", response_model=FolderBase)
+@router.post("/folders", response_model=FolderBase)
 async def create_folder(folder: FolderBase):
     folder.id = generate_id()
-    response = supabase.table("folders").insert(folder.dict()).execute()
-    return response.data[0]
+    rows = await db.insert("folders", folder.dict())
+    return rows[0]
+
+app = create_app()
 
 # Run the application with uvicorn
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "0.0.0.0")
-    uvicorn.run(app, host=host, port=port) 
\ No newline at end of file
+    if os.environ.get("SERVER_MODE") == "production":
+        # Pre-forked workers, each with its own event loop and lifespan-managed clients
+        uvicorn.run(
+            "main:create_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=WORKERS,
+            loop="asyncio" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+            timeout_graceful_shutdown=int(os.environ.get("GRACEFUL_SHUTDOWN_TIMEOUT", 30)),
+            proxy_headers=True,
+            access_log=False,
+        )
+    else:
+        uvicorn.run(app, host=host, port=port) 
\ No newline at end of file
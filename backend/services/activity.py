@@ -0,0 +1,105 @@
+import os
+import time
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+ACTIVITY_BATCH_SIZE = int(os.environ.get("ACTIVITY_BATCH_SIZE", 100))
+ACTIVITY_FLUSH_SECONDS = float(os.environ.get("ACTIVITY_FLUSH_SECONDS", 2))
+ACTIVITY_MAX_PENDING = int(os.environ.get("ACTIVITY_MAX_PENDING", 10000))
+
+
+def activity_id() -> str:
+    # Starts with the time in nanoseconds, so ids sort by time and work as a pagination cursor
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}"
+
+
+class ActivityFeed:
+    """Write-behind log of created, updated and deleted records.
+
+    Handlers record changes in memory, which costs no database round trip. The
+    buffer is written to the append-only `activity` table in batches, every
+    ACTIVITY_FLUSH_SECONDS or once ACTIVITY_BATCH_SIZE entries are waiting, and on
+    shutdown. Reads merge the entries that are not written yet.
+    """
+
+    def __init__(self, batch_size: int = ACTIVITY_BATCH_SIZE, flush_interval: float = ACTIVITY_FLUSH_SECONDS,
+                 max_pending: int = ACTIVITY_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.db = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._flushing: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, action: str, entity: str, row: Dict[str, Any]):
+        self._buffer.append({
+            "id": activity_id(),
+            "created_at": datetime.now().isoformat(),
+            "action": action,
+            "entity": entity,
+            "entity_id": row.get("id"),
+            "title": row.get("title") or row.get("name"),
+            "project_id": row.get("project_id"),
+            "employee_id": row.get("employee_id"),
+        })
+        if len(self._buffer) > self.max_pending:
+            del self._buffer[0]
+        if self._wakeup and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> List[Dict[str, Any]]:
+        return self._flushing + self._buffer
+
+    async def flush(self):
+        if self._flushing or not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._flushing = batch
+        try:
+            await asyncio.to_thread(self.db.insert_many, "activity", batch)
+        except Exception as e:
+            print(f"Activity flush failed, keeping {len(batch)} entries: {str(e)}")
+            self._buffer = (batch + self._buffer)[-self.max_pending:]
+        finally:
+            self._flushing = []
+
+    def merge(self, rows: List[Dict[str, Any]], limit: int, before: Optional[str] = None,
+              filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Adds the pending entries matching a page query to the rows read for it, newest first."""
+        merged = {row["id"]: row for row in rows}
+        for entry in self.pending():
+            if before is not None and entry["id"] >= before:
+                continue
+            if all(entry.get(column) == value for column, value in (filters or {}).items()):
+                merged.setdefault(entry["id"], entry)
+        return sorted(merged.values(), key=lambda entry: entry["id"], reverse=True)[:limit]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self, db):
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._buffer:
+            print(f"Activity flush on shutdown failed, {len(self._buffer)} entries lost")
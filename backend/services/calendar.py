@@ -0,0 +1,94 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Hashable, Optional, Tuple
+from cachetools import TTLCache
+
+from database.repository import bucket_rows
+from services import recurrence
+
+CALENDAR_CACHE_SIZE = int(os.environ.get("CALENDAR_CACHE_SIZE", 256))
+# Bounds how long another worker's changes can take to show up
+CALENDAR_CACHE_TTL = int(os.environ.get("CALENDAR_CACHE_TTL", 60))
+
+TASK_COLUMNS = "id,title,status,priority,due_date,project_id,employee_id"
+REMINDER_COLUMNS = "id,title,status,priority,due_date,project_id,employee_id"
+EVENT_FIELDS = ("id", "title", "type", "due_date", "project_id", "employee_id", "series_id", "occurrence_id")
+
+
+def window(view: str, day: date) -> Tuple[date, date]:
+    """Returns the first day and the day after the last one of the month or week (Monday to Sunday) containing day."""
+    if view == "month":
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    elif view == "week":
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    else:
+        raise ValueError("view must be month or week")
+    return start, end
+
+
+def build(db, start: date, end: date, filters: Dict[str, Any], top: int) -> Dict[str, Any]:
+    """Counts the tasks, events and reminders of each day in [start, end) and picks the first `top` of each."""
+    buckets = {
+        "tasks": db.bucket_by_day("tasks", "due_date", start.isoformat(), end.isoformat(),
+                                  columns=TASK_COLUMNS, eq=filters, top=top),
+        "reminders": db.bucket_by_day("reminders", "due_date", start.isoformat(), end.isoformat(),
+                                      columns=REMINDER_COLUMNS, eq=filters, top=top),
+    }
+
+    # Recurring events have no row per occurrence, so events are expanded and bucketed here
+    window_start = datetime.combine(start, datetime.min.time())
+    window_end = datetime.combine(end, datetime.min.time()) - timedelta(microseconds=1)
+    rows = db.select_all(
+        "events",
+        eq=filters,
+        lte={"due_date": window_end.isoformat()},
+        gte={"recurrence_end": window_start.isoformat()}
+    )
+    occurrences, truncated = recurrence.expand_all(rows, window_start, window_end)
+    occurrences = [{field: occurrence.get(field) for field in EVENT_FIELDS} for occurrence in occurrences]
+    buckets["events"] = bucket_rows(occurrences, "due_date", top)
+
+    empty = {"count": 0, "items": []}
+    days = []
+    for offset in range((end - start).days):
+        day = (start + timedelta(days=offset)).isoformat()
+        days.append({"date": day, **{kind: buckets[kind].get(day, empty) for kind in ("tasks", "events", "reminders")}})
+    # Series with more than recurrence.MAX_WINDOW_OCCURRENCES occurrences in the window are undercounted
+    return {"start": start.isoformat(), "end": (end - timedelta(days=1)).isoformat(), "days": days,
+            "truncated_series": truncated}
+
+
+class CalendarCache:
+    """Caches calendar windows until a task, event or reminder in them changes.
+
+    Keys start with the window bounds, so a change only drops the windows
+    containing its date. Changes to recurring events drop every window.
+    """
+
+    def __init__(self, maxsize: int = CALENDAR_CACHE_SIZE, ttl: int = CALENDAR_CACHE_TTL):
+        self._windows: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Bumped on every change, so a window computed while a change happened is not stored
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        return self._windows.get(key)
+
+    def set(self, key: Hashable, value: Dict[str, Any], generation: int):
+        if generation == self.generation:
+            self._windows[key] = value
+
+    def invalidate(self, *rows: Optional[Dict[str, Any]]):
+        self.generation += 1
+        for row in rows:
+            if not row:
+                continue
+            if row.get("rrule") or not row.get("due_date"):
+                self._windows.clear()
+                return
+            day = str(row["due_date"])[:10]
+            for key in list(self._windows.keys()):
+                start, end = key[0], key[1]
+                if start <= day < end:
+                    self._windows.pop(key, None)
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers using the same key.
+
+    The call runs in a worker thread, so the blocking Supabase client does not hold
+    the event loop and identical requests arriving meanwhile can join it. Once the
+    call finishes the key is released. A caller can still get rows read just before
+    a concurrent write, like it could without sharing; forget() makes sure callers
+    arriving after the write start a new call instead of joining an older one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._release(key, done))
+        # Shielded so a disconnecting client does not cancel the call for the others
+        return await asyncio.shield(future)
+
+    def forget(self, name: str):
+        """Stops sharing the running calls whose key starts with `name`, e.g. a table that was written to."""
+        for key in [key for key in self._calls if isinstance(key, tuple) and key[:1] == (name,)]:
+            del self._calls[key]
+
+    def _release(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
@@ -0,0 +1,125 @@
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 500))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+# Qualities above 5 cost far more CPU than they save in bytes on dynamic responses
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks br or gzip from an Accept-Encoding header, preferring br when equally acceptable."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = None
+    for encoding in candidates:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+    return best[0] if best else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.finish
+        else:
+            # wbits 31 writes the gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.flush = self._compressor.flush
+
+
+class CompressionMiddleware:
+    """Compresses JSON and text responses with brotli or gzip, as negotiated by Accept-Encoding.
+
+    Streamed responses are compressed chunk by chunk, so a large list starts
+    reaching the client before it is fully encoded. Small responses and responses
+    that already carry a Content-Encoding are sent unchanged.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for header, value in scope.get("headers", []):
+            if header == b"accept-encoding":
+                encoding = accepted_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def compress(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                if b"content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                await send({**start_message, "headers": self._headers(start_message, encoding)})
+
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.flush()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compress)
+
+    @staticmethod
+    def _headers(start_message, encoding: str) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = b"Accept-Encoding"
+        for name, value in start_message.get("headers", []):
+            if name == b"vary":
+                vary = value + b", " + vary
+            elif name not in (b"content-length", b"content-encoding"):
+                headers.append((name, value))
+        headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"vary", vary))
+        return headers
@@ -0,0 +1,282 @@
+import os
+import time
+import base64
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from cachetools import TTLCache
+
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", 10000))
+# How long a key claimed by a request that never finished (a crashed worker) blocks retries
+IDEMPOTENCY_PENDING_TIMEOUT = int(os.environ.get("IDEMPOTENCY_PENDING_TIMEOUT", 300))
+IDEMPOTENCY_POLL_SECONDS = float(os.environ.get("IDEMPOTENCY_POLL_SECONDS", 0.5))
+PRUNE_INTERVAL = 3600
+
+Key = Tuple[str, str, str]
+# (request fingerprint, status, headers, body)
+StoredResponse = Tuple[str, int, List[Tuple[bytes, bytes]], bytes]
+
+MISMATCH_BODY = b'{"detail":"Idempotency-Key was already used for a different request"}'
+
+
+def _boundary(content_type: Optional[str]) -> Optional[bytes]:
+    if not content_type or not content_type.lower().startswith("multipart/"):
+        return None
+    for parameter in content_type.split(";")[1:]:
+        name, _, value = parameter.strip().partition("=")
+        if name.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    return None
+
+
+def fingerprint(query_string: bytes, body: bytes, content_type: Optional[str] = None) -> str:
+    """Hashes the parts of a request a retry must repeat: the query string and the body.
+
+    Multipart boundaries are left out, since clients pick a new one for every attempt.
+    """
+    boundary = _boundary(content_type)
+    if boundary:
+        body = body.replace(b"--" + boundary, b"--")
+    digest = hashlib.sha256(query_string)
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class MemoryIdempotencyStore:
+    """Keeps responses and running requests in this process, which is enough for a single worker."""
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: int = IDEMPOTENCY_TTL):
+        self._responses: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Key, asyncio.Future] = {}
+
+    def start(self, db):
+        pass
+
+    async def get(self, key: Key) -> Optional[StoredResponse]:
+        return self._responses.get(key)
+
+    async def reserve(self, key: Key) -> bool:
+        """Claims the key for a request about to run. Returns False if another request holds it."""
+        if key in self._inflight:
+            return False
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return True
+
+    async def wait(self, key: Key):
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            await asyncio.shield(inflight)
+
+    async def save(self, key: Key, stored: StoredResponse):
+        self._responses[key] = stored
+        await self.release(key)
+
+    async def release(self, key: Key):
+        self._inflight.pop(key).set_result(None)
+
+
+class TableIdempotencyStore:
+    """Keeps responses in the idempotency_keys table, so a retry reaching another worker is replayed too.
+
+    A request claims its key by inserting a row without a status; the insert fails
+    for every other request with the same key, and those poll the row until the
+    response is saved or the row is released. Claims older than
+    IDEMPOTENCY_PENDING_TIMEOUT are taken over, so a crashed worker does not
+    block a key for good. Expired rows are deleted about once an hour.
+    """
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, pending_timeout: int = IDEMPOTENCY_PENDING_TIMEOUT,
+                 poll_interval: float = IDEMPOTENCY_POLL_SECONDS):
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self.poll_interval = poll_interval
+        self.db = None
+        # created_at of the claims made here, so a release never drops a claim taken over by another request
+        self._claims: Dict[Key, str] = {}
+        self._pruned_at = 0.0
+
+    def start(self, db):
+        self.db = db
+
+    @staticmethod
+    def _id(key: Key) -> str:
+        return " ".join(key)
+
+    @staticmethod
+    def _expired(row: Dict, seconds: int) -> bool:
+        return row["created_at"] < (datetime.now() - timedelta(seconds=seconds)).isoformat()
+
+    async def get(self, key: Key) -> Optional[StoredResponse]:
+        row = await asyncio.to_thread(self.db.get, "idempotency_keys", self._id(key))
+        if row is None or row.get("status") is None or self._expired(row, self.ttl):
+            return None
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in row["headers"]]
+        return row["fingerprint"], row["status"], headers, base64.b64decode(row["body"])
+
+    async def reserve(self, key: Key) -> bool:
+        row = {"id": self._id(key), "created_at": datetime.now().isoformat()}
+        for _ in range(2):
+            try:
+                await asyncio.to_thread(self.db.insert, "idempotency_keys", row)
+            except Exception:
+                existing = await asyncio.to_thread(self.db.get, "idempotency_keys", row["id"])
+                if existing is None:
+                    raise
+                if not self._expired(existing, self.pending_timeout if existing.get("status") is None else self.ttl):
+                    return False
+                # Matching created_at too, so only one of several requests taking over the key deletes it
+                await asyncio.to_thread(self.db.delete, "idempotency_keys",
+                                        eq={"id": row["id"], "created_at": existing["created_at"]})
+                continue
+            self._claims[key] = row["created_at"]
+            if time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+                self._pruned_at = time.monotonic()
+                await self._prune()
+            return True
+        return False
+
+    async def wait(self, key: Key):
+        await asyncio.sleep(self.poll_interval)
+
+    async def save(self, key: Key, stored: StoredResponse):
+        request_fingerprint, status, headers, body = stored
+        data = {
+            "fingerprint": request_fingerprint,
+            "status": status,
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+            "body": base64.b64encode(body).decode("ascii"),
+        }
+        created_at = self._claims.pop(key)
+        await asyncio.to_thread(self.db.update, "idempotency_keys", data,
+                                eq={"id": self._id(key), "created_at": created_at})
+
+    async def release(self, key: Key):
+        created_at = self._claims.pop(key)
+        await asyncio.to_thread(self.db.delete, "idempotency_keys", eq={"id": self._id(key), "created_at": created_at})
+
+    async def _prune(self):
+        cutoff = (datetime.now() - timedelta(seconds=self.ttl)).isoformat()
+        try:
+            await asyncio.to_thread(self.db.delete, "idempotency_keys", lt={"created_at": cutoff})
+        except Exception as e:
+            print(f"Idempotency key cleanup failed: {str(e)}")
+
+
+class IdempotencyMiddleware:
+    """Replays the original response when a create request is retried with the same Idempotency-Key.
+
+    Successful responses are stored per method, path and key for IDEMPOTENCY_TTL
+    seconds, together with a fingerprint of the request. A retry that arrives while
+    the original is still running waits for it instead of repeating the work, e.g.
+    a second Drive upload. Failed responses are not stored, so the client can retry
+    them. Reusing a key for a request with another body or query string is answered
+    with 422 rather than with the response of the first request.
+
+    Keys live in `store`, in memory by default; with several workers a
+    TableIdempotencyStore shares them through the database.
+    """
+
+    def __init__(self, app, store=None, methods=("POST",)):
+        self.app = app
+        self.store = store or MemoryIdempotencyStore()
+        self.methods = set(methods)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = self._header(scope, b"idempotency-key")
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        # The body is read up front to fingerprint it; handlers buffer uploads in memory anyway
+        body, request_fingerprint = await self._read(scope, receive)
+        if body is None:
+            # The client went away before sending the whole request
+            return
+        key = (scope["method"], scope["path"], idempotency_key)
+        while True:
+            stored = await self.store.get(key)
+            if stored is not None:
+                if stored[0] != request_fingerprint:
+                    await self._reject(send)
+                else:
+                    await self._replay(stored, send)
+                return
+            if await self.store.reserve(key):
+                break
+            await self.store.wait(key)
+
+        replayed_body = False
+
+        async def receive_body():
+            nonlocal replayed_body
+            if not replayed_body:
+                replayed_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        response_body = bytearray()
+        complete = False
+
+        async def capture(message):
+            nonlocal status, headers, complete
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response_body.extend(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        finally:
+            if complete and 200 <= status < 300:
+                await self.store.save(key, (request_fingerprint, status, headers, bytes(response_body)))
+            else:
+                await self.store.release(key)
+
+    @staticmethod
+    def _header(scope, name: bytes) -> Optional[str]:
+        for header, value in scope.get("headers", []):
+            if header == name:
+                return value.decode("latin-1")
+        return None
+
+    async def _read(self, scope, receive) -> Tuple[Optional[bytes], str]:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return None, ""
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        return body, fingerprint(scope.get("query_string", b""), body, self._header(scope, b"content-type"))
+
+    @staticmethod
+    async def _reject(send):
+        await send({
+            "type": "http.response.start",
+            "status": 422,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(MISMATCH_BODY)).encode())],
+        })
+        await send({"type": "http.response.body", "body": MISMATCH_BODY})
+
+    @staticmethod
+    async def _replay(stored: StoredResponse, send):
+        _, status, headers, body = stored
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,280 @@
+import os
+import io
+import re
+import base64
+import asyncio
+import zipfile
+import multiprocessing
+from typing import Optional, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+from cachetools import TTLCache
+
+# Thumbnails are stored as small WEBP images, previews as truncated plain text
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_MIME_TYPE = "image/webp"
+PREVIEW_TEXT_LENGTH = 2000
+PREVIEW_MAX_BYTES = int(os.environ.get("PREVIEW_MAX_BYTES", 50 * 1024 * 1024))
+PREVIEW_WORKERS = int(os.environ.get("PREVIEW_WORKERS", min(4, os.cpu_count() or 1)))
+# A worker stuck on a pathological file is killed after this many seconds
+PREVIEW_TIMEOUT = float(os.environ.get("PREVIEW_TIMEOUT", 60))
+# Uploads waiting for a preview hold their content in memory, past this many they get none
+PREVIEW_MAX_PENDING = int(os.environ.get("PREVIEW_MAX_PENDING", PREVIEW_WORKERS * 4))
+# Workers are not forked from the server process, which already runs threads
+PREVIEW_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+OFFICE_DOCUMENTS = {
+    "docx": ("word/document.xml", "p", "t"),
+    "pptx": ("ppt/slides/slide1.xml", "p", "t"),
+    "xlsx": ("xl/sharedStrings.xml", "si", "t"),
+    "odt": ("content.xml", "p", None),
+    "odp": ("content.xml", "p", None),
+    "ods": ("content.xml", "p", None),
+}
+
+TEXT_EXTENSIONS = {"txt", "md", "csv", "json", "log", "xml", "html", "htm", "yaml", "yml"}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = set()
+# Bounds how long other workers keep serving the preview of a deleted file
+PREVIEW_CACHE_TTL = int(os.environ.get("PREVIEW_CACHE_TTL", 60))
+_cache = TTLCache(maxsize=int(os.environ.get("PREVIEW_CACHE_SIZE", 1024)), ttl=PREVIEW_CACHE_TTL)
+
+
+def _file_kind(content_type: Optional[str], filename: Optional[str]) -> Optional[str]:
+    content_type = (content_type or "").lower()
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    if content_type.startswith("image/"):
+        return "image"
+    if content_type == "application/pdf" or extension == "pdf":
+        return "pdf"
+    if extension in OFFICE_DOCUMENTS:
+        return extension
+    if content_type.startswith("text/") or extension in TEXT_EXTENSIONS:
+        return "text"
+    return None
+
+
+def _encode_thumbnail(image) -> bytes:
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    output = io.BytesIO()
+    image.save(output, format="WEBP", quality=70, method=4)
+    return output.getvalue()
+
+
+def _image_thumbnail(content: bytes) -> Optional[bytes]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    image = Image.open(io.BytesIO(content))
+    # Let JPEG decode at a reduced scale instead of the full resolution
+    image.draft("RGB", THUMBNAIL_SIZE)
+    return _encode_thumbnail(image)
+
+
+def _pdf_thumbnail(content: bytes) -> Optional[bytes]:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return None
+    pdf = pdfium.PdfDocument(content)
+    try:
+        page = pdf[0]
+        width, height = page.get_size()
+        scale = max(THUMBNAIL_SIZE) / max(width, height, 1)
+        image = page.render(scale=scale).to_pil()
+        return _encode_thumbnail(image)
+    finally:
+        pdf.close()
+
+
+def _pdf_text(content: bytes) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    reader = PdfReader(io.BytesIO(content))
+    if not reader.pages:
+        return None
+    return reader.pages[0].extract_text()
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _office_text(content: bytes, kind: str) -> Optional[str]:
+    member, block_tag, text_tag = OFFICE_DOCUMENTS[kind]
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        try:
+            info = archive.getinfo(member)
+        except KeyError:
+            return None
+        # Guard against zip bombs, a preview never needs a huge XML part
+        if info.file_size > PREVIEW_MAX_BYTES:
+            return None
+        root = ElementTree.fromstring(archive.read(member))
+
+    lines = []
+    length = 0
+    for block in root.iter():
+        if _local_name(block.tag) != block_tag:
+            continue
+        if text_tag:
+            line = "".join(e.text or "" for e in block.iter() if _local_name(e.tag) == text_tag)
+        else:
+            line = "".join(block.itertext())
+        if line:
+            lines.append(line)
+            length += len(line)
+            if length >= PREVIEW_TEXT_LENGTH:
+                break
+    return "\n".join(lines)
+
+
+def _plain_text(content: bytes) -> str:
+    return content[:PREVIEW_TEXT_LENGTH * 4].decode("utf-8", errors="replace")
+
+
+def _normalize_text(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    return text[:PREVIEW_TEXT_LENGTH] or None
+
+
+def generate_preview(content: bytes, content_type: Optional[str], filename: Optional[str]) -> Dict[str, Any]:
+    """Builds the thumbnail and text preview for a file. Runs inside a worker process."""
+    kind = _file_kind(content_type, filename)
+    thumbnail = None
+    text = None
+    if kind == "image":
+        thumbnail = _image_thumbnail(content)
+    elif kind == "pdf":
+        thumbnail = _pdf_thumbnail(content)
+        text = _pdf_text(content)
+    elif kind in OFFICE_DOCUMENTS:
+        text = _office_text(content, kind)
+    elif kind == "text":
+        text = _plain_text(content)
+    return {"thumbnail": thumbnail, "preview_text": _normalize_text(text)}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PREVIEW_WORKERS,
+                                        mp_context=multiprocessing.get_context(PREVIEW_START_METHOD))
+    return _executor
+
+
+def _reset_executor(executor: ProcessPoolExecutor, terminate: bool = False):
+    """Replaces a broken or stuck pool, the next ingestion starts a new one."""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    if terminate:
+        # A hung worker never returns on its own; the other files in flight fail with it
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _to_row(file_id: str, preview: Dict[str, Any]) -> Dict[str, Any]:
+    thumbnail = preview.get("thumbnail")
+    return {
+        "file_id": file_id,
+        "thumbnail": base64.b64encode(thumbnail).decode("ascii") if thumbnail else None,
+        "mime_type": THUMBNAIL_MIME_TYPE if thumbnail else None,
+        "preview_text": preview.get("preview_text"),
+    }
+
+
+def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    thumbnail = row.get("thumbnail")
+    return {
+        "thumbnail": base64.b64decode(thumbnail) if thumbnail else None,
+        "mime_type": row.get("mime_type") or THUMBNAIL_MIME_TYPE,
+        "preview_text": row.get("preview_text"),
+    }
+
+
+async def ingest(db, file_id: str, content: bytes, content_type: Optional[str], filename: Optional[str]):
+    """Generates the preview in the process pool and stores it in the file_previews table."""
+    if _file_kind(content_type, filename) is None or len(content) > PREVIEW_MAX_BYTES:
+        return None
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    try:
+        preview = await asyncio.wait_for(
+            loop.run_in_executor(executor, generate_preview, content, content_type, filename),
+            timeout=PREVIEW_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        print(f"Preview generation timed out for {file_id}, restarting the preview workers")
+        _reset_executor(executor, terminate=True)
+        return None
+    except BrokenProcessPool:
+        # A worker crashed (a segfault in a decoder, an OOM kill), the pool cannot be used again
+        print(f"Preview worker died while processing {file_id}, restarting the preview workers")
+        _reset_executor(executor)
+        return None
+    except Exception as e:
+        print(f"Preview generation failed for {file_id}: {str(e)}")
+        return None
+    if not preview["thumbnail"] and not preview["preview_text"]:
+        return None
+
+    row = _to_row(file_id, preview)
+    await asyncio.to_thread(db.upsert, "file_previews", row)
+    _cache[file_id] = _from_row(row)
+    return row
+
+
+def schedule(db, file_id: str, content: bytes, content_type: Optional[str], filename: Optional[str]):
+    """Starts preview ingestion in the background so the upload request is not delayed."""
+    if len(_pending) >= PREVIEW_MAX_PENDING:
+        print(f"Preview queue is full, skipping the preview of {file_id}")
+        return None
+    task = asyncio.get_running_loop().create_task(ingest(db, file_id, content, content_type, filename))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+    return task
+
+
+async def get_preview(db, file_id: str) -> Optional[Dict[str, Any]]:
+    preview = _cache.get(file_id)
+    if preview is not None:
+        return preview
+    rows = await asyncio.to_thread(db.select, "file_previews", eq={"file_id": file_id})
+    if not rows:
+        return None
+    preview = _from_row(rows[0])
+    _cache[file_id] = preview
+    return preview
+
+
+async def discard(db, file_id: str):
+    _cache.pop(file_id, None)
+    await asyncio.to_thread(db.delete, "file_previews", eq={"file_id": file_id})
+
+
+async def drain():
+    """Waits for scheduled ingestions, so shutdown does not lose previews of finished uploads."""
+    if _pending:
+        await asyncio.gather(*_pending, return_exceptions=True)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,180 @@
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_CAPTURES = int(os.environ.get("PROFILE_CAPTURES", 50))
+# Threads running blocking calls for the event loop; the default matches asyncio's
+THREAD_POOL_SIZE = int(os.environ.get("THREAD_POOL_SIZE", min(32, (os.cpu_count() or 1) + 4)))
+
+EXECUTOR_MODULE = os.path.join("concurrent", "futures", "thread.py")
+
+
+# Threads of the executor made by create_executor(). Their names cannot be relied
+# on, event loops other than asyncio's (uvloop) name them differently.
+worker_threads: Set[int] = set()
+
+
+def _register_worker_thread():
+    worker_threads.add(threading.get_ident())
+
+
+def create_executor(max_workers: int = THREAD_POOL_SIZE, thread_name_prefix: str = "worker") -> ThreadPoolExecutor:
+    """Creates a thread pool whose threads are sampled, e.g. the event loop's default executor."""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix,
+                              initializer=_register_worker_thread)
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _folded(frame, worker: bool) -> Optional[str]:
+    labels = []
+    busy = not worker
+    while frame is not None:
+        code = frame.f_code
+        # Idle worker threads wait for work outside of a work item
+        if worker and code.co_name == "run" and code.co_filename.endswith(EXECUTOR_MODULE):
+            busy = True
+        labels.append(_label(code))
+        frame = frame.f_back
+    if not busy:
+        return None
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """Statistical profiler that records the stacks of the serving threads at a fixed interval.
+
+    It samples the event loop thread and the busy worker threads, so blocking calls
+    moved to threads (uploads, Supabase reads) show up as well. Samples of other
+    requests served at the same time are included too.
+    """
+
+    def __init__(self, loop_thread: int, interval: float = PROFILE_INTERVAL):
+        self.loop_thread = loop_thread
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_thread = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                if thread_id != self.loop_thread and thread_id not in worker_threads:
+                    continue
+                stack = _folded(frame, worker=thread_id != self.loop_thread)
+                if stack:
+                    self.samples[stack] += 1
+
+    def folded(self) -> str:
+        """Returns the samples in folded stack format, the input of flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """Keeps the most recent captures, dropping the oldest once `size` is reached."""
+
+    def __init__(self, size: int = PROFILE_CAPTURES):
+        self._captures: deque = deque(maxlen=size)
+
+    def add(self, capture: Dict[str, Any]):
+        self._captures.append(capture)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {key: value for key, value in capture.items() if key != "folded"}
+            for capture in reversed(self._captures)
+        ]
+
+    def get(self, capture_id: str) -> Optional[Dict[str, Any]]:
+        for capture in self._captures:
+            if capture["id"] == capture_id:
+                return capture
+        return None
+
+
+class ProfilingMiddleware:
+    """Profiles single requests, when they carry the X-Profile-Token header or are sampled.
+
+    Only one request is profiled at a time per worker. When neither PROFILING_TOKEN
+    nor PROFILE_SAMPLE_RATE is set, requests are passed straight through.
+    """
+
+    def __init__(self, app, store: ProfileStore, token: str = PROFILING_TOKEN,
+                 sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.store = store
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.enabled = bool(token) or sample_rate > 0
+        self._active = False
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token:
+            for header, value in scope.get("headers", []):
+                if header == b"x-profile-token" and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        # Reading the captures is never profiled itself
+        if not self.enabled or scope["type"] != "http" or self._active or scope["path"].startswith("/admin/"):
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def capture_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self._active = True
+        sampler = Sampler(threading.get_ident())
+        started_at = time.time()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, capture_status)
+        finally:
+            sampler.stop()
+            self._active = False
+            self.store.add({
+                "id": str(uuid.uuid4()),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "trigger": trigger,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "samples": sum(sampler.samples.values()),
+                "folded": sampler.folded(),
+            })
@@ -0,0 +1,145 @@
+import os
+import itertools
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+from dateutil.rrule import rrulestr
+from cachetools import LRUCache
+
+# Stored as recurrence_end for series without an end, so window queries need no OR
+OPEN_ENDED = "9999-12-31T23:59:59"
+# Series longer than this are treated as open ended instead of being walked to the end
+MAX_SERIES_OCCURRENCES = 10000
+# Upper bound on occurrences returned for one series in one window
+MAX_WINDOW_OCCURRENCES = 1000
+# Upper bound on occurrences walked from the series start to reach a window, about 140 years of a daily series
+MAX_EXPANSION_STEPS = 50000
+# Thousands of occurrences a month, so walking them to a window is too slow
+SUBDAILY_FREQUENCIES = ("HOURLY", "MINUTELY", "SECONDLY")
+# Distinct windows remembered per series, e.g. the months a user paged through
+WINDOWS_PER_EVENT = 32
+
+# event_id -> {(fingerprint, start, end): [occurrence datetimes]}
+_expansions = LRUCache(maxsize=int(os.environ.get("RECURRENCE_CACHE_SIZE", 2048)))
+
+
+class ExpansionError(ValueError):
+    """Raised when reaching a window would walk more than MAX_EXPANSION_STEPS occurrences."""
+
+
+def _parse(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _align(value: datetime, reference: datetime) -> datetime:
+    """Makes value comparable with reference, which decides if times are naive or aware."""
+    if reference.tzinfo is None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    if reference.tzinfo is not None and value.tzinfo is None:
+        return value.replace(tzinfo=reference.tzinfo)
+    return value
+
+
+def _rule(event: Dict[str, Any]):
+    dtstart = _parse(event["due_date"])
+    rule = rrulestr(event["rrule"], dtstart=dtstart)
+    return dtstart, rule
+
+
+def validate(event: Dict[str, Any]):
+    """Raises ValueError if the event's rrule or exdates cannot be parsed."""
+    if not event.get("rrule"):
+        return
+    spec = event["rrule"].upper().replace(" ", "")
+    for frequency in SUBDAILY_FREQUENCIES:
+        if f"FREQ={frequency}" in spec:
+            raise ValueError("events cannot repeat more often than daily")
+    _rule(event)
+    for exdate in event.get("exdates") or []:
+        _parse(exdate)
+
+
+def recurrence_end(event: Dict[str, Any]) -> str:
+    """Returns the start of the last occurrence, used to find the series overlapping a window."""
+    if not event.get("rrule"):
+        return str(event["due_date"])
+    _, rule = _rule(event)
+    spec = event["rrule"].upper()
+    if "COUNT=" not in spec and "UNTIL=" not in spec:
+        return OPEN_ENDED
+    occurrences = list(itertools.islice(rule, MAX_SERIES_OCCURRENCES + 1))
+    if not occurrences:
+        return str(event["due_date"])
+    if len(occurrences) > MAX_SERIES_OCCURRENCES:
+        return OPEN_ENDED
+    return occurrences[-1].isoformat()
+
+
+def _fingerprint(event: Dict[str, Any]):
+    return (event.get("rrule"), str(event.get("due_date")), tuple(event.get("exdates") or ()))
+
+
+def _expand(event: Dict[str, Any], start: datetime, end: datetime) -> Tuple[List[datetime], bool]:
+    dtstart, rule = _rule(event)
+    start = _align(start, dtstart)
+    end = _align(end, dtstart)
+    excluded = {_align(_parse(exdate), dtstart) for exdate in event.get("exdates") or []}
+    occurrences = []
+    # Walked from DTSTART like rule.xafter() would, but counted so an old dense series cannot run for minutes
+    for step, occurrence in enumerate(rule):
+        if occurrence > end:
+            break
+        if step >= MAX_EXPANSION_STEPS:
+            raise ExpansionError(f"series {event['id']} has too many occurrences before {start.isoformat()}")
+        if occurrence < start or occurrence in excluded:
+            continue
+        if len(occurrences) >= MAX_WINDOW_OCCURRENCES:
+            return occurrences, True
+        occurrences.append(occurrence)
+    return occurrences, False
+
+
+def expand(event: Dict[str, Any], start: datetime, end: datetime) -> Tuple[List[Dict[str, Any]], bool]:
+    """Returns the occurrences of an event inside [start, end], and whether they were cut at MAX_WINDOW_OCCURRENCES.
+
+    Expansions are memoized per event and window until invalidate() is called for
+    the event. A changed rule also changes the cache key, so stale rows never match.
+    Raises ExpansionError if the window is too far from the start of a dense series.
+    """
+    if not event.get("rrule"):
+        return [event], False
+    key = (_fingerprint(event), start.isoformat(), end.isoformat())
+    windows = _expansions.get(event["id"])
+    if windows is None:
+        windows = _expansions[event["id"]] = LRUCache(maxsize=WINDOWS_PER_EVENT)
+    expansion = windows.get(key)
+    if expansion is None:
+        expansion = windows[key] = _expand(event, start, end)
+    occurrences, truncated = expansion
+
+    return [
+        {
+            **event,
+            "due_date": occurrence.isoformat(),
+            "series_id": event["id"],
+            "occurrence_id": f"{event['id']}:{occurrence.isoformat()}",
+        }
+        for occurrence in occurrences
+    ], truncated
+
+
+def expand_all(events: List[Dict[str, Any]], start: datetime, end: datetime) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Expands every event into the window. Returns the occurrences and the ids of the series that were cut."""
+    occurrences = []
+    truncated = []
+    for event in events:
+        expanded, cut = expand(event, start, end)
+        occurrences.extend(expanded)
+        if cut:
+            truncated.append(event["id"])
+    return occurrences, truncated
+
+
+def invalidate(event_id: str):
+    _expansions.pop(event_id, None)
@@ -0,0 +1,251 @@
+import math
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Transport errors worth retrying, matched by class name so the Google and
+# Supabase HTTP libraries do not have to be imported here
+RETRYABLE_ERRORS = {"TransportError", "TimeoutException", "HttpLib2Error", "ResponseNotReady"}
+# Postgres connection, resource and statement timeout errors
+RETRYABLE_SQLSTATES = ("08", "53", "57")
+
+
+class Overloaded(Exception):
+    """Raised instead of calling a service that is rate limited, saturated or failing.
+
+    The API answers it with 503 and a Retry-After header.
+    """
+
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"{service} is temporarily unavailable, retry in {math.ceil(retry_after)}s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """Returns the HTTP status of a Drive or Supabase error, if it carries one."""
+    response = getattr(error, "resp", None) or getattr(error, "response", None)
+    for status in (getattr(response, "status", None), getattr(response, "status_code", None)):
+        if isinstance(status, int):
+            return status
+    code = str(getattr(error, "code", ""))
+    return int(code) if len(code) == 3 and code.isdigit() else None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = error_status(error)
+    if status is not None:
+        # Drive reports quota errors as 403 rateLimitExceeded or userRateLimitExceeded
+        return status == 429 or status >= 500 or (status == 403 and "ratelimitexceeded" in str(error).lower())
+    code = str(getattr(error, "code", "") or "")
+    if len(code) == 5 and code.startswith(RETRYABLE_SQLSTATES):
+        return True
+    return isinstance(error, OSError) or any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `capacity` calls."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to latency (additive increase, multiplicative decrease).
+
+    The limit grows by about one per limit's worth of fast calls and shrinks when a
+    call takes more than `tolerance` times the lowest latency seen for the same
+    operation, or fails. Baselines are kept per operation, since a single row read
+    and a large upload are not comparable. Each baseline slowly follows the
+    observed latency, so a lasting change is learned.
+    """
+
+    def __init__(self, initial: int = 10, minimum: int = 1, maximum: int = 100,
+                 tolerance: float = 2.0, backoff: float = 0.9):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.inflight = 0
+        self._baselines: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                return False
+            self.inflight += 1
+            return True
+
+    def cancel(self):
+        """Frees a slot taken by acquire() without recording a call."""
+        with self._lock:
+            self.inflight -= 1
+
+    def release(self, latency: float, failed: bool = False, operation: Hashable = None):
+        with self._lock:
+            self.inflight -= 1
+            baseline = self._baselines.get(operation)
+            if baseline is None or latency < baseline:
+                baseline = latency
+            else:
+                baseline += (latency - baseline) * 0.01
+            self._baselines[operation] = baseline
+            if failed or latency > baseline * self.tolerance:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class CircuitBreaker:
+    """Fails fast for `reset_timeout` seconds after `threshold` consecutive failures.
+
+    Once the timeout passes a single trial call is let through; it closes the
+    circuit on success and opens it again on failure.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def peek(self) -> float:
+        """Returns the seconds until the next trial call, without taking it."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def check(self) -> float:
+        """Returns 0 if a call may go through, otherwise the seconds until the next trial."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._trial:
+                return 1.0
+            self._trial = True
+            return 0.0
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+
+class Guard:
+    """Runs calls to an external service behind a rate limit, a concurrency limit and a circuit breaker.
+
+    Calls over the limits are rejected with Overloaded rather than queued, so a
+    slow service cannot tie up every request. Failed calls with a 429, a 5xx or a
+    transport error are retried with full jitter backoff; when the retries run
+    out the caller gets Overloaded as well. Calls made on the event loop thread
+    are never retried, since the backoff sleep would stall every other request.
+    """
+
+    def __init__(self, name: str, bucket: Optional[TokenBucket] = None,
+                 limiter: Optional[AdaptiveLimiter] = None, breaker: Optional[CircuitBreaker] = None,
+                 attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0):
+        self.name = name
+        self.bucket = bucket
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def check(self):
+        """Raises Overloaded while the circuit is open, before the caller starts work it cannot finish."""
+        wait = self.breaker.peek()
+        if wait:
+            raise Overloaded(self.name, wait)
+
+    def _admit(self):
+        wait = self.breaker.peek()
+        if not wait and self.bucket:
+            wait = self.bucket.take()
+        if wait:
+            raise Overloaded(self.name, wait)
+        if not self.limiter.acquire():
+            raise Overloaded(self.name, 1.0)
+        # Taken last, so a trial call is only claimed by a call that will run
+        wait = self.breaker.check()
+        if wait:
+            self.limiter.cancel()
+            raise Overloaded(self.name, wait)
+
+    def call(self, fn: Callable[..., Any], *args, retry: bool = True, operation: Hashable = None) -> Any:
+        """Runs fn(*args). `operation` names the kind of call, for comparing its latency with similar calls."""
+        self._admit()
+        start = time.monotonic()
+        failed = False
+        try:
+            attempts = self.attempts if retry and not _on_event_loop() else 1
+            for attempt in range(attempts):
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The service answered, so it counts as healthy
+                        self.breaker.success()
+                        raise
+                    failed = True
+                    self.breaker.failure()
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                    if attempt + 1 == attempts or self.breaker.is_open:
+                        raise Overloaded(self.name, max(delay, self.breaker.peek(), 1.0)) from e
+                    print(f"{self.name} call failed, retrying in {delay:.2f}s: {str(e)}")
+                    time.sleep(delay)
+                    # Retries count against the rate limit too
+                    wait = self.bucket.take() if self.bucket else 0.0
+                    if wait > self.max_delay:
+                        raise Overloaded(self.name, wait) from e
+                    time.sleep(wait)
+                else:
+                    self.breaker.success()
+                    return result
+        finally:
+            self.limiter.release(time.monotonic() - start, failed, operation)
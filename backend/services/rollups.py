@@ -0,0 +1,201 @@
+import time
+import heapq
+import asyncio
+import itertools
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.scheduler import parse_due_date
+
+COUNTERS = (
+    "total_tasks",
+    "open_tasks",
+    "overdue_tasks",
+    "completed_tasks",
+    "total_reminders",
+    "pending_reminders",
+    "events",
+    "notes",
+)
+
+# Kept by database triggers in WORKLOAD_TABLE when the counters are shared. overdue_tasks
+# changes with the time rather than with writes, so it is counted when read.
+WORKLOAD_TABLE = "workload_counters"
+SHARED_COUNTERS = tuple(name for name in COUNTERS if name != "overdue_tasks")
+ENTITY_COLUMNS = {"employees": "employee_id", "projects": "project_id"}
+
+# Columns needed to rebuild the counters of each table
+REBUILD_COLUMNS = {
+    "tasks": "id,status,due_date,employee_id,project_id",
+    "reminders": "id,status,employee_id,project_id",
+    "events": "id,employee_id,project_id",
+    "notes": "id,employee_id,project_id",
+}
+
+
+def _contributions(table: str, row: Dict[str, Any]) -> Dict[str, int]:
+    if table == "tasks":
+        completed = row.get("status") == "completed"
+        return {"total_tasks": 1, "completed_tasks": int(completed), "open_tasks": int(not completed)}
+    if table == "reminders":
+        return {"total_reminders": 1, "pending_reminders": int(not row.get("status"))}
+    return {table: 1}
+
+
+def _entities(row: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    entities = []
+    if row.get("employee_id"):
+        entities.append(("employees", row["employee_id"]))
+    if row.get("project_id"):
+        entities.append(("projects", row["project_id"]))
+    return tuple(entities)
+
+
+def _with_percentage(counters: Dict[str, Any]) -> Dict[str, Any]:
+    total = counters["total_tasks"]
+    counters["completion_percentage"] = round(100 * counters["completed_tasks"] / total, 1) if total else 0.0
+    return counters
+
+
+def _read(db) -> Dict[str, List[Dict[str, Any]]]:
+    return {table: db.select_all(table, columns) for table, columns in REBUILD_COLUMNS.items()}
+
+
+class RollupIndex:
+    """Per-employee and per-project workload counters.
+
+    Counters are adjusted by the mutation handlers with the difference between a
+    row's old and new contribution, so reading them never touches the database.
+    Open tasks that are not yet overdue sit in a min-heap by due date and are
+    moved to overdue_tasks as reads pass their due time.
+    """
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        # (table, id) -> [entities, contributions, sequence of the pending overdue entry]
+        self._rows: Dict[Tuple[str, str], List[Any]] = {}
+        self._due_heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        # Changes applied while a rebuild reads the tables, replayed on top of its result
+        self._journal: Optional[List[Tuple[str, str, Any]]] = None
+        self._rebuild_lock = asyncio.Lock()
+        # Set once a rebuild has loaded the history, counters are partial until then
+        self.ready = False
+
+    def _add(self, entities, contributions: Dict[str, int], sign: int):
+        for entity in entities:
+            counters = self._counters[entity]
+            for name, value in contributions.items():
+                counters[name] += sign * value
+
+    def apply(self, table: str, row: Dict[str, Any]):
+        """Records a created or updated row."""
+        if self._journal is not None:
+            self._journal.append(("apply", table, row))
+        self._remove(table, row["id"])
+        entities = _entities(row)
+        contributions = _contributions(table, row)
+        state = [entities, contributions, None]
+        if contributions.get("open_tasks"):
+            due_ts = parse_due_date(row.get("due_date"))
+            if due_ts is not None and due_ts <= time.time():
+                contributions["overdue_tasks"] = 1
+            elif due_ts is not None:
+                state[2] = next(self._counter)
+                heapq.heappush(self._due_heap, (due_ts, state[2], row["id"]))
+        self._add(entities, contributions, 1)
+        self._rows[(table, row["id"])] = state
+
+    def remove(self, table: str, row_id: str):
+        if self._journal is not None:
+            self._journal.append(("remove", table, row_id))
+        self._remove(table, row_id)
+
+    def _remove(self, table: str, row_id: str):
+        state = self._rows.pop((table, row_id), None)
+        if state is not None:
+            self._add(state[0], state[1], -1)
+
+    def _advance(self):
+        now = time.time()
+        while self._due_heap and self._due_heap[0][0] <= now:
+            _, seq, task_id = heapq.heappop(self._due_heap)
+            state = self._rows.get(("tasks", task_id))
+            if state is None or state[2] != seq:
+                continue
+            state[1]["overdue_tasks"] = 1
+            state[2] = None
+            self._add(state[0], {"overdue_tasks": 1}, 1)
+
+    def stats(self, kind: str, entity_id: str) -> Dict[str, Any]:
+        self._advance()
+        counters = dict(self._counters.get((kind, entity_id)) or dict.fromkeys(COUNTERS, 0))
+        return _with_percentage(counters)
+
+    async def read(self, kind: str, entity_id: str) -> Dict[str, Any]:
+        return self.stats(kind, entity_id)
+
+    async def rebuild(self, db):
+        """Recomputes every counter from the database, correcting any drift.
+
+        The tables are read in a worker thread. The read may or may not see changes
+        applied meanwhile, so those are journaled and applied again afterwards.
+        """
+        async with self._rebuild_lock:
+            self._journal = []
+            try:
+                rows = await asyncio.to_thread(_read, db)
+            finally:
+                journal, self._journal = self._journal, None
+            self._counters.clear()
+            self._rows.clear()
+            self._due_heap = []
+            for table, table_rows in rows.items():
+                for row in table_rows:
+                    self.apply(table, row)
+            for change, table, value in journal:
+                if change == "apply":
+                    self.apply(table, value)
+                else:
+                    self.remove(table, value)
+            self.ready = True
+
+
+class TableRollups:
+    """Workload counters shared by every worker through the workload_counters table.
+
+    Database triggers on tasks, reminders, events and notes adjust the counters in
+    the same transaction as the write, so changes made by any worker, or directly
+    in the database, are counted. A read is one lookup by key and one indexed
+    count of the overdue tasks.
+    """
+
+    def __init__(self):
+        self.db = None
+        self.ready = False
+
+    def apply(self, table: str, row: Dict[str, Any]):
+        pass
+
+    def remove(self, table: str, row_id: str):
+        pass
+
+    def stats(self, kind: str, entity_id: str) -> Dict[str, Any]:
+        row = self.db.get(WORKLOAD_TABLE, f"{kind}:{entity_id}") or {}
+        counters = {name: row.get(name) or 0 for name in SHARED_COUNTERS}
+        counters["overdue_tasks"] = self.db.count(
+            "tasks",
+            eq={ENTITY_COLUMNS[kind]: entity_id},
+            neq={"status": "completed"},
+            lt={"due_date": datetime.now().isoformat()},
+        )
+        return _with_percentage({name: counters[name] for name in COUNTERS})
+
+    async def read(self, kind: str, entity_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.stats, kind, entity_id)
+
+    async def rebuild(self, db):
+        """Nothing to recompute, the triggers see every write."""
+        self.db = db
+        self.ready = True
@@ -0,0 +1,307 @@
+import os
+import time
+import uuid
+import heapq
+import asyncio
+import itertools
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+# Items that were due more than this long ago are not reloaded on startup
+SCHEDULER_GRACE_SECONDS = int(os.environ.get("SCHEDULER_GRACE_SECONDS", 24 * 60 * 60))
+# Upper bound for a single sleep, so wall clock adjustments are picked up
+MAX_SLEEP_SECONDS = 3600
+# How often each worker reads the notifications fired by the others
+RELAY_POLL_SECONDS = float(os.environ.get("RELAY_POLL_SECONDS", 1))
+# Notifications are read again for this long, in case one committed after a later one was read
+RELAY_LOOKBACK_SECONDS = 10
+RELAY_RETENTION_SECONDS = 24 * 60 * 60
+# Wait between attempts to load the schedule while the database is unreachable
+LOAD_RETRY_SECONDS = 5
+
+NOTIFICATION_TYPES = {
+    "reminders": "reminder",
+    "tasks": "task_deadline",
+}
+
+
+def parse_due_date(value: Optional[str]) -> Optional[float]:
+    """Converts a stored due_date to a timestamp. Naive values are treated as local time."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+class Notifier:
+    """Receives due items from the scheduler. Subclass to add a delivery channel."""
+
+    async def notify(self, notification: Dict[str, Any]):
+        raise NotImplementedError
+
+
+class ConnectionNotifier(Notifier):
+    """Pushes notifications to every connected websocket client."""
+
+    def __init__(self):
+        self.connections = set()
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.connections.add(websocket)
+
+    def disconnect(self, websocket):
+        self.connections.discard(websocket)
+
+    async def notify(self, notification: Dict[str, Any]):
+        for websocket in list(self.connections):
+            try:
+                await websocket.send_json(notification)
+            except Exception:
+                self.disconnect(websocket)
+
+
+class WebhookNotifier(Notifier):
+    """Posts notifications to an external URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def notify(self, notification: Dict[str, Any]):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=10) as client:
+            await client.post(self.url, json=notification)
+
+
+class NotificationRelay(Notifier):
+    """Delivers notifications to the local notifier of every worker, through the notifications table.
+
+    Only the worker that fires an item notifies; with several workers, its
+    websocket clients are only a part of all of them. The relay stores the
+    notification, and each worker polls the table and passes new rows on.
+    """
+
+    def __init__(self, local: Notifier, interval: float = RELAY_POLL_SECONDS):
+        self.local = local
+        self.interval = interval
+        self.db = None
+        self._seen: Dict[str, float] = {}
+        self._since = ""
+        self._task: Optional[asyncio.Task] = None
+
+    async def notify(self, notification: Dict[str, Any]):
+        row = {
+            # Starts with the time in nanoseconds, so ids sort by time
+            "id": f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}",
+            "created_at": datetime.now().isoformat(),
+            "payload": notification,
+        }
+        await asyncio.to_thread(self.db.insert, "notifications", row)
+
+    async def poll(self):
+        since = max(self._since, f"{time.time_ns() - int(RELAY_LOOKBACK_SECONDS * 1e9):020d}")
+        rows = await asyncio.to_thread(self.db.select, "notifications", gt={"id": since}, order="id")
+        now = time.monotonic()
+        for row in rows:
+            if row["id"] in self._seen:
+                continue
+            self._seen[row["id"]] = now
+            await self.local.notify(row["payload"])
+        for notification_id, seen_at in list(self._seen.items()):
+            if now - seen_at > 2 * RELAY_LOOKBACK_SECONDS:
+                del self._seen[notification_id]
+
+    async def _run(self):
+        pruned_at = 0.0
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+                if time.monotonic() - pruned_at > MAX_SLEEP_SECONDS:
+                    pruned_at = time.monotonic()
+                    cutoff = f"{time.time_ns() - RELAY_RETENTION_SECONDS * 10 ** 9:020d}"
+                    await asyncio.to_thread(self.db.delete, "notifications", lt={"id": cutoff})
+            except Exception as e:
+                print(f"Notification relay failed: {str(e)}")
+
+    def start(self, db):
+        self.db = db
+        # Notifications fired before this worker started are not delivered
+        self._since = f"{time.time_ns():020d}"
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class DueScheduler:
+    """Fires reminders and task deadlines once, at their due_date.
+
+    Upcoming items are kept in a min-heap keyed by due time. Rescheduling or
+    cancelling an item only replaces its entry in a dict; outdated heap entries
+    are skipped when they reach the top, so no full scan is ever needed.
+    """
+
+    def __init__(self, notifiers: Optional[List[Notifier]] = None):
+        self.db = None
+        self.notifiers = list(notifiers or [])
+        self._heap: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._entries: Dict[Tuple[str, str], Tuple[float, str, int]] = {}
+        self._counter = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Keys tracked or cancelled while load() reads the tables, their loaded rows are older
+        self._touched: Optional[set] = None
+
+    def add_notifier(self, notifier: Notifier):
+        self.notifiers.append(notifier)
+
+    def _is_pending(self, table: str, row: Dict[str, Any]) -> bool:
+        if row.get("notified"):
+            return False
+        if table == "reminders":
+            return not row.get("status")
+        return row.get("status") != "completed"
+
+    def track(self, table: str, row: Dict[str, Any]):
+        """Schedules a created or updated row, or drops it when it no longer needs to fire."""
+        due_ts = parse_due_date(row.get("due_date"))
+        if due_ts is None or not self._is_pending(table, row):
+            self.cancel(table, row["id"])
+            return
+        key = (table, row["id"])
+        if self._touched is not None:
+            self._touched.add(key)
+        seq = next(self._counter)
+        self._entries[key] = (due_ts, row["due_date"], seq)
+        heapq.heappush(self._heap, (due_ts, seq, key))
+        self._wake.set()
+
+    def cancel(self, table: str, item_id: str):
+        if self._touched is not None:
+            self._touched.add((table, item_id))
+        self._entries.pop((table, item_id), None)
+
+    def _discard_stale(self):
+        while self._heap:
+            _, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _pop_due(self) -> List[Tuple[Tuple[str, str], str]]:
+        due = []
+        now = time.time()
+        self._discard_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            _, due_value, _ = self._entries.pop(key)
+            due.append((key, due_value))
+            self._discard_stale()
+        return due
+
+    def _next_delay(self) -> Optional[float]:
+        self._discard_stale()
+        if not self._heap:
+            return None
+        return min(max(self._heap[0][0] - time.time(), 0), MAX_SLEEP_SECONDS)
+
+    async def _fire(self, key: Tuple[str, str], due_value: str):
+        table, item_id = key
+        # The conditional update makes firing idempotent: a row that was completed,
+        # rescheduled or already delivered by another worker matches nothing.
+        eq = {"id": item_id, "notified": False, "due_date": due_value}
+        neq = None
+        if table == "reminders":
+            eq["status"] = False
+        else:
+            neq = {"status": "completed"}
+        rows = await asyncio.to_thread(self.db.update, table, {"notified": True}, eq=eq, neq=neq)
+        if not rows:
+            return
+
+        row = rows[0]
+        notification = {
+            "type": NOTIFICATION_TYPES[table],
+            "id": row["id"],
+            "title": row.get("title"),
+            "due_date": row.get("due_date"),
+            "priority": row.get("priority"),
+            "project_id": row.get("project_id"),
+            "employee_id": row.get("employee_id"),
+        }
+        for notifier in self.notifiers:
+            try:
+                await notifier.notify(notification)
+            except Exception as e:
+                print(f"Notification delivery failed: {str(e)}")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.load()
+                break
+            except Exception as e:
+                print(f"Loading the schedule failed, retrying in {LOAD_RETRY_SECONDS}s: {str(e)}")
+                await asyncio.sleep(LOAD_RETRY_SECONDS)
+        while True:
+            self._wake.clear()
+            for key, due_value in self._pop_due():
+                try:
+                    await self._fire(key, due_value)
+                except Exception as e:
+                    print(f"Failed to fire {key[0]} {key[1]}: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._next_delay())
+            except asyncio.TimeoutError:
+                pass
+
+    def _read_pending(self) -> List[Tuple[str, Dict[str, Any]]]:
+        cutoff = (datetime.now() - timedelta(seconds=SCHEDULER_GRACE_SECONDS)).isoformat()
+        reminders = self.db.select_all(
+            "reminders", eq={"notified": False, "status": False}, gte={"due_date": cutoff}
+        )
+        tasks = self.db.select_all(
+            "tasks", eq={"notified": False}, neq={"status": "completed"}, gte={"due_date": cutoff}
+        )
+        return [("reminders", row) for row in reminders] + [("tasks", row) for row in tasks]
+
+    async def load(self):
+        """Rebuilds the schedule with indexed range queries, paged so no pending row is cut off.
+
+        The tables are read in a worker thread while requests are served; items
+        tracked or cancelled meanwhile keep their newer state.
+        """
+        self._touched = set()
+        try:
+            rows = await asyncio.to_thread(self._read_pending)
+        finally:
+            touched, self._touched = self._touched, None
+        for table, row in rows:
+            if (table, row["id"]) not in touched:
+                self.track(table, row)
+
+    async def start(self, db):
+        """Starts firing due items. The schedule is loaded in the background, so startup does not wait for it."""
+        self.db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,34 @@
+import os
+from typing import Any, Dict, List, Type
+
+import orjson
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+STREAM_THRESHOLD = int(os.environ.get("STREAM_THRESHOLD", 1000))
+STREAM_BATCH_SIZE = 1000
+
+
+def columns(model: Type[BaseModel]) -> str:
+    """Returns the select list for a response model, so rows can be sent without re-validating them."""
+    return ",".join(model.model_fields)
+
+
+async def _stream_array(rows: List[Dict[str, Any]]):
+    for start in range(0, len(rows), STREAM_BATCH_SIZE):
+        # Encode a batch as an array and strip its brackets to splice it into the stream
+        encoded = orjson.dumps(rows[start:start + STREAM_BATCH_SIZE])
+        yield (b"[" if start == 0 else b",") + encoded[1:-1]
+    yield b"]"
+
+
+def rows_response(rows: List[Dict[str, Any]]):
+    """Serializes rows read from the database as a JSON array.
+
+    The rows come straight from the repository, so they skip FastAPI's response
+    model validation and jsonable_encoder. Large lists are encoded and sent in
+    batches instead of being built as one body.
+    """
+    if len(rows) <= STREAM_THRESHOLD:
+        return ORJSONResponse(rows)
+    return StreamingResponse(_stream_array(rows), media_type="application/json")
@@ -0,0 +1,36 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from database import repository as repository_module
+from database.sqlite import SQLiteRepository
+
+
+@pytest.fixture
+def repository(tmp_path):
+    return SQLiteRepository(str(tmp_path / "crm.db"))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A client of a fresh app on an empty SQLite database, with its own scheduler, stats and caches."""
+    monkeypatch.setenv("DATABASE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "api.db"))
+    monkeypatch.setattr(repository_module, "_repository", None)
+
+    import main
+    from services import calendar
+    from services.activity import ActivityFeed
+    from services.coalesce import SingleFlight
+    from services.idempotency import MemoryIdempotencyStore
+    from services.rollups import RollupIndex
+    from services.scheduler import DueScheduler
+
+    monkeypatch.setattr(main, "reads", SingleFlight())
+    monkeypatch.setattr(main, "scheduler", DueScheduler(notifiers=[main.connection_notifier]))
+    monkeypatch.setattr(main, "rollups", RollupIndex())
+    monkeypatch.setattr(main, "calendar_cache", calendar.CalendarCache())
+    # Written only when a test flushes it or the app stops
+    monkeypatch.setattr(main, "activity", ActivityFeed(flush_interval=3600))
+    monkeypatch.setattr(main, "idempotency_store", MemoryIdempotencyStore())
+    with TestClient(main.create_app()) as test_client:
+        yield test_client
@@ -0,0 +1,66 @@
+import asyncio
+
+import main
+from services.activity import ActivityFeed
+
+
+def create_projects(client, count):
+    return [
+        client.post("/projects", json={"title": f"Project {index}", "status": "active"}).json()
+        for index in range(count)
+    ]
+
+
+def test_pages_follow_the_cursor(client):
+    create_projects(client, 7)
+
+    seen = []
+    page = client.get("/activity", params={"limit": 3}).json()
+    while True:
+        seen.extend(item["title"] for item in page["items"])
+        if page["next"] is None:
+            break
+        page = client.get("/activity", params={"limit": 3, "before": page["next"]}).json()
+
+    assert seen == [f"Project {index}" for index in reversed(range(7))]
+
+
+def test_pending_and_written_entries_are_merged(client):
+    create_projects(client, 3)
+    client.portal.call(main.activity.flush)
+    assert len(main.repository.select("activity")) == 3
+    create_projects(client, 2)
+
+    items = client.get("/activity", params={"limit": 4}).json()["items"]
+
+    assert len(main.activity.pending()) == 2
+    assert [item["title"] for item in items] == ["Project 1", "Project 0", "Project 2", "Project 1"]
+    assert [item["id"] for item in items] == sorted((item["id"] for item in items), reverse=True)
+
+
+def test_filters(client):
+    project = create_projects(client, 1)[0]
+    client.post("/tasks", data={"title": "Task", "status": "todo", "priority": "low", "due_date": "2030-01-01",
+                                "project_id": project["id"]})
+    client.delete(f"/projects/{project['id']}")
+
+    items = client.get("/activity", params={"entity": "projects"}).json()["items"]
+    assert [(item["action"], item["entity"]) for item in items] == [("deleted", "projects"), ("created", "projects")]
+
+    items = client.get("/activity", params={"project_id": project["id"]}).json()["items"]
+    assert [item["entity"] for item in items] == ["tasks"]
+
+
+def test_shutdown_writes_the_buffer(repository):
+    feed = ActivityFeed(flush_interval=3600)
+
+    async def record_and_stop():
+        feed.start(repository)
+        feed.record("created", "notes", {"id": "note-1", "title": "Minutes"})
+        await feed.stop()
+
+    asyncio.run(record_and_stop())
+
+    rows = repository.select("activity")
+    assert [(row["entity_id"], row["title"]) for row in rows] == [("note-1", "Minutes")]
+    assert feed.pending() == []
@@ -0,0 +1,133 @@
+from datetime import date
+
+import pytest
+
+from database.supabase import SupabaseRepository
+from services import calendar
+from services.calendar import CalendarCache
+
+TASK = {"title": "Task", "status": "todo", "priority": "low"}
+
+
+def create_task(client, due_date, **fields):
+    return client.post("/tasks", data={**TASK, "due_date": due_date, **fields}).json()
+
+
+def test_windows():
+    assert calendar.window("month", date(2030, 2, 14)) == (date(2030, 2, 1), date(2030, 3, 1))
+    assert calendar.window("month", date(2030, 12, 31)) == (date(2030, 12, 1), date(2031, 1, 1))
+    # 2030-01-16 is a Wednesday
+    assert calendar.window("week", date(2030, 1, 16)) == (date(2030, 1, 14), date(2030, 1, 21))
+    with pytest.raises(ValueError):
+        calendar.window("year", date(2030, 1, 1))
+
+
+def test_days_are_counted_and_capped(client):
+    for hour in range(4):
+        create_task(client, f"2030-01-15T0{hour}:00:00")
+    create_task(client, "2030-02-01T09:00:00")
+    client.post("/events", json={"title": "Standup", "type": "meeting", "due_date": "2030-01-14T09:00:00",
+                                 "rrule": "FREQ=DAILY;COUNT=3"})
+
+    result = client.get("/calendar", params={"date": "2030-01-10", "top": 2}).json()
+
+    assert (result["start"], result["end"], len(result["days"])) == ("2030-01-01", "2030-01-31", 31)
+    days = {day["date"]: day for day in result["days"]}
+    assert days["2030-01-15"]["tasks"]["count"] == 4
+    assert [task["due_date"] for task in days["2030-01-15"]["tasks"]["items"]] == ["2030-01-15T00:00:00",
+                                                                                 "2030-01-15T01:00:00"]
+    assert [days[day]["events"]["count"] for day in ("2030-01-13", "2030-01-14", "2030-01-16", "2030-01-17")] == [0, 1, 1, 0]
+    assert client.get("/calendar", params={"view": "day"}).status_code == 400
+
+
+def test_windows_are_cached_until_a_change_in_them(client, monkeypatch):
+    import main
+
+    builds = []
+    build = calendar.build
+    monkeypatch.setattr(main.calendar, "build", lambda *args: builds.append(args[1]) or build(*args))
+    task = create_task(client, "2030-01-15T09:00:00")
+
+    client.get("/calendar", params={"date": "2030-01-10"})
+    client.get("/calendar", params={"date": "2030-01-20"})
+    client.get("/calendar", params={"date": "2030-03-10"})
+    assert builds == [date(2030, 1, 1), date(2030, 3, 1)]
+
+    # A change in March leaves January cached
+    create_task(client, "2030-03-02T09:00:00")
+    client.get("/calendar", params={"date": "2030-01-10"})
+    assert builds == [date(2030, 1, 1), date(2030, 3, 1)]
+
+    client.put(f"/tasks/{task['id']}", data={"title": "Renamed"})
+    days = client.get("/calendar", params={"date": "2030-01-10"}).json()["days"]
+    assert builds == [date(2030, 1, 1), date(2030, 3, 1), date(2030, 1, 1)]
+    assert days[14]["tasks"]["items"][0]["title"] == "Renamed"
+
+
+def test_moving_a_task_drops_both_windows():
+    cache = CalendarCache()
+    for month in ("2030-01", "2030-02", "2030-03"):
+        cache.set((f"{month}-01", f"{month}-31"), {"month": month}, cache.generation)
+
+    cache.invalidate({"due_date": "2030-01-15T09:00:00"}, {"due_date": "2030-03-02"})
+
+    assert [cache.get((f"{month}-01", f"{month}-31")) for month in ("2030-01", "2030-02", "2030-03")] == [
+        None, {"month": "2030-02"}, None]
+
+
+def test_recurring_changes_drop_every_window():
+    cache = CalendarCache()
+    cache.set(("2030-01-01", "2030-02-01"), {}, cache.generation)
+    cache.set(("2031-01-01", "2031-02-01"), {}, cache.generation)
+
+    cache.invalidate({"due_date": "2029-06-01T09:00:00", "rrule": "FREQ=WEEKLY"})
+
+    assert cache.get(("2030-01-01", "2030-02-01")) is None
+    assert cache.get(("2031-01-01", "2031-02-01")) is None
+
+
+def test_windows_built_during_a_change_are_not_stored():
+    cache = CalendarCache()
+    generation = cache.generation
+
+    cache.invalidate({"due_date": "2030-06-01"})
+    cache.set(("2030-01-01", "2030-02-01"), {"stale": True}, generation)
+
+    assert cache.get(("2030-01-01", "2030-02-01")) is None
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class Call:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return Response(self.data)
+
+
+class RpcClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return Call(self.rows)
+
+
+def test_supabase_buckets_are_grouped_by_the_database():
+    client = RpcClient([{"day": "2030-01-15", "count": 4, "items": [{"id": "a"}, {"id": "b"}]}])
+    repository = SupabaseRepository(client)
+
+    buckets = repository.bucket_by_day("tasks", "due_date", "2030-01-01", "2030-02-01", columns="id,title",
+                                       eq={"project_id": "p1"}, top=2)
+
+    assert buckets == {"2030-01-15": {"count": 4, "items": [{"id": "a"}, {"id": "b"}]}}
+    assert client.calls == [("calendar_buckets", {
+        "source": "tasks", "date_column": "due_date", "window_start": "2030-01-01", "window_end": "2030-02-01",
+        "item_columns": "id,title", "filters": {"project_id": "p1"}, "top": 2,
+    })]
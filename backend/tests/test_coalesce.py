@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+from services.coalesce import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    reads = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def read(name):
+        calls.append(name)
+        release.wait(5)
+        return [name]
+
+    async def read_three_times():
+        first = asyncio.create_task(reads.do(("tasks",), read, "first"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(reads.do(("tasks",), read, "second"))
+        other = asyncio.create_task(reads.do(("notes",), read, "other"))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(first, second, other)
+
+    assert asyncio.run(read_three_times()) == [["first"], ["first"], ["other"]]
+    assert sorted(calls) == ["first", "other"]
+
+
+def test_the_key_is_released_when_the_call_finishes():
+    reads = SingleFlight()
+    calls = []
+
+    async def read_twice():
+        await reads.do(("tasks",), calls.append, 1)
+        await reads.do(("tasks",), calls.append, 2)
+
+    asyncio.run(read_twice())
+    assert calls == [1, 2]
+
+
+def test_callers_after_forget_start_a_new_call():
+    reads = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def read(name):
+        calls.append(name)
+        release.wait(5)
+        return name
+
+    async def read_around_a_write():
+        before = asyncio.create_task(reads.do(("tasks", None), read, "before"))
+        await asyncio.sleep(0.05)
+        reads.forget("tasks")
+        after = asyncio.create_task(reads.do(("tasks", None), read, "after"))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(before, after)
+
+    assert asyncio.run(read_around_a_write()) == ["before", "after"]
+    assert calls == ["before", "after"]
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    reads = SingleFlight()
+    release = threading.Event()
+
+    def read():
+        release.wait(5)
+        return "rows"
+
+    async def cancel_one():
+        leaving = asyncio.create_task(reads.do(("tasks",), read))
+        staying = asyncio.create_task(reads.do(("tasks",), read))
+        await asyncio.sleep(0.05)
+        leaving.cancel()
+        release.set()
+        return await staying
+
+    assert asyncio.run(cancel_one()) == "rows"
+
+
+def test_writes_drop_shared_list_reads(client):
+    import main
+
+    # Stands in for a list read still running when the write arrives
+    main.reads._calls[("projects",)] = main.reads._calls[("notes",)] = object()
+
+    client.post("/projects", json={"title": "Launch", "status": "active"})
+
+    assert list(main.reads._calls) == [("notes",)]
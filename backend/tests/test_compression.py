@@ -0,0 +1,54 @@
+import pytest
+
+from services import compression
+from services.compression import accepted_encoding
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("gzip;q=0", None),
+])
+def test_accepted_encoding(header, expected):
+    assert accepted_encoding(header) == expected
+
+
+def test_gzip_only_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+    assert accepted_encoding("br, gzip") == "gzip"
+    assert accepted_encoding("br") is None
+
+
+@pytest.fixture
+def projects(client):
+    for index in range(20):
+        response = client.post("/projects", json={"title": f"Project {index}", "status": "active",
+                                                  "description": "A project with a long enough description"})
+        assert response.status_code == 200
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+def test_large_responses_are_compressed(client, projects, encoding):
+    response = client.get("/projects", headers={"Accept-Encoding": encoding})
+
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 20
+    assert response.num_bytes_downloaded < len(response.content)
+
+
+def test_uncompressed_without_accept_encoding(client, projects):
+    response = client.get("/projects", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert len(response.json()) == 20
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,116 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.idempotency import IdempotencyMiddleware, TableIdempotencyStore, fingerprint
+
+TASK = {"title": "Write report", "status": "todo", "priority": "low", "due_date": "2030-01-01"}
+
+
+def test_retries_replay_the_first_response(client):
+    headers = {"Idempotency-Key": "create-task-1"}
+
+    first = client.post("/tasks", data=TASK, headers=headers)
+    retry = client.post("/tasks", data=TASK, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert len(client.get("/tasks").json()) == 1
+
+
+def test_multipart_retries_match_despite_a_new_boundary(client):
+    headers = {"Idempotency-Key": "upload-1"}
+
+    first = client.post("/tasks", data=TASK, files={"unused": ("a.txt", b"content")}, headers=headers)
+    retry = client.post("/tasks", data=TASK, files={"unused": ("a.txt", b"content")}, headers=headers)
+
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+def test_a_reused_key_with_another_body_is_rejected(client):
+    headers = {"Idempotency-Key": "create-task-2"}
+    client.post("/tasks", data=TASK, headers=headers)
+
+    response = client.post("/tasks", data={**TASK, "title": "Something else"}, headers=headers)
+
+    assert response.status_code == 422
+    assert len(client.get("/tasks").json()) == 1
+
+
+def test_failed_responses_are_not_stored(client):
+    headers = {"Idempotency-Key": "create-project"}
+
+    assert client.post("/projects", json={"title": "Missing status"}, headers=headers).status_code == 422
+    response = client.post("/projects", json={"title": "Launch", "status": "active"}, headers=headers)
+
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_requests_without_a_key_are_not_deduplicated(client):
+    client.post("/tasks", data=TASK)
+    client.post("/tasks", data=TASK)
+
+    assert len(client.get("/tasks").json()) == 2
+
+
+def test_fingerprint_ignores_only_the_multipart_boundary():
+    body_a = b"--aaa\r\nContent-Disposition: form-data; name=\"x\"\r\n\r\n1\r\n--aaa--\r\n"
+    body_b = body_a.replace(b"aaa", b"bbb")
+
+    assert fingerprint(b"", body_a, "multipart/form-data; boundary=aaa") == \
+        fingerprint(b"", body_b, 'multipart/form-data; boundary="bbb"')
+    assert fingerprint(b"", body_a, "application/json") != fingerprint(b"", body_b, "application/json")
+    assert fingerprint(b"a=1", b"{}") != fingerprint(b"a=2", b"{}")
+
+
+def counting_app(store):
+    app = FastAPI()
+    calls = []
+
+    @app.post("/items")
+    async def create_item():
+        calls.append(1)
+        return {"number": len(calls)}
+
+    app.add_middleware(IdempotencyMiddleware, store=store)
+    return app, calls
+
+
+def test_table_store_shares_keys_between_apps(repository):
+    # Two apps on one database stand in for two workers
+    stores = [TableIdempotencyStore(), TableIdempotencyStore()]
+    for store in stores:
+        store.start(repository)
+    first_app, first_calls = counting_app(stores[0])
+    second_app, second_calls = counting_app(stores[1])
+    headers = {"Idempotency-Key": "shared"}
+
+    first = TestClient(first_app).post("/items", json={"a": 1}, headers=headers)
+    retry = TestClient(second_app).post("/items", json={"a": 1}, headers=headers)
+    mismatch = TestClient(second_app).post("/items", json={"a": 2}, headers=headers)
+
+    assert first.json() == retry.json() == {"number": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert mismatch.status_code == 422
+    assert len(first_calls) == 1 and second_calls == []
+
+
+def test_table_store_takes_over_abandoned_keys(repository):
+    store = TableIdempotencyStore(pending_timeout=0)
+    store.start(repository)
+    key = ("POST", "/items", "abandoned")
+
+    async def claim_twice():
+        assert await store.reserve(key)
+        # The first claim is never saved or released, like a crashed worker's
+        store._claims.clear()
+        await asyncio.sleep(0.01)
+        return await store.reserve(key)
+
+    assert asyncio.run(claim_twice())
+    assert len(repository.select("idempotency_keys")) == 1
@@ -0,0 +1,89 @@
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+from services import previews
+
+generate_preview = previews.generate_preview
+
+
+def crash(content, content_type, filename):
+    os._exit(1)
+
+
+def hang(content, content_type, filename):
+    time.sleep(60)
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(previews, "_cache", previews.TTLCache(maxsize=16, ttl=60))
+    yield
+    previews.shutdown()
+
+
+def docx(text):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as archive:
+        archive.writestr("word/document.xml",
+                         '<w:document xmlns:w="w"><w:body><w:p><w:r><w:t>' + text + "</w:t></w:r></w:p>"
+                         "</w:body></w:document>")
+    return output.getvalue()
+
+
+def test_text_previews():
+    assert previews.generate_preview(b"Hello   world", "text/plain", "a.txt")["preview_text"] == "Hello world"
+    assert previews.generate_preview(docx("Quarterly plan"), None, "plan.docx")["preview_text"] == "Quarterly plan"
+    assert previews.generate_preview(b"\x00\x01", "application/octet-stream", "a.bin") == \
+        {"thumbnail": None, "preview_text": None}
+
+
+def test_ingest_stores_the_preview(repository):
+    row = asyncio.run(previews.ingest(repository, "file-1", b"Meeting notes", "text/plain", "notes.txt"))
+
+    assert row["preview_text"] == "Meeting notes"
+    assert repository.select("file_previews")[0]["preview_text"] == "Meeting notes"
+    previews._cache.clear()
+    assert asyncio.run(previews.get_preview(repository, "file-1"))["preview_text"] == "Meeting notes"
+
+    asyncio.run(previews.discard(repository, "file-1"))
+    assert asyncio.run(previews.get_preview(repository, "file-1")) is None
+
+
+def test_a_crashed_worker_is_replaced(repository, monkeypatch):
+    monkeypatch.setattr(previews, "generate_preview", crash)
+    assert asyncio.run(previews.ingest(repository, "file-1", b"boom", "text/plain", "a.txt")) is None
+
+    monkeypatch.setattr(previews, "generate_preview", generate_preview)
+    row = asyncio.run(previews.ingest(repository, "file-2", b"fine", "text/plain", "b.txt"))
+    assert row["preview_text"] == "fine"
+
+
+def test_a_stuck_worker_times_out(repository, monkeypatch):
+    monkeypatch.setattr(previews, "generate_preview", hang)
+    monkeypatch.setattr(previews, "PREVIEW_TIMEOUT", 1)
+    started = time.monotonic()
+    assert asyncio.run(previews.ingest(repository, "file-1", b"slow", "text/plain", "a.txt")) is None
+    assert time.monotonic() - started < 30
+
+    monkeypatch.setattr(previews, "generate_preview", generate_preview)
+    row = asyncio.run(previews.ingest(repository, "file-2", b"fine", "text/plain", "b.txt"))
+    assert row["preview_text"] == "fine"
+
+
+def test_previews_are_skipped_when_the_queue_is_full(repository, monkeypatch):
+    monkeypatch.setattr(previews, "PREVIEW_MAX_PENDING", 1)
+
+    async def schedule_two():
+        first = previews.schedule(repository, "file-1", b"one", "text/plain", "a.txt")
+        second = previews.schedule(repository, "file-2", b"two", "text/plain", "b.txt")
+        await previews.drain()
+        return first, second
+
+    first, second = asyncio.run(schedule_two())
+    assert first is not None and second is None
+    assert [row["file_id"] for row in repository.select("file_previews")] == ["file-1"]
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.profiling import ProfileStore, ProfilingMiddleware, create_executor
+
+
+def blocking_call():
+    time.sleep(0.1)
+
+
+def profiled_app(store, **options):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        # Busy in a pool thread, like an upload or a database call
+        await asyncio.get_running_loop().run_in_executor(executor, blocking_call)
+        return {"done": True}
+
+    executor = create_executor(1, "test")
+    app.add_middleware(ProfilingMiddleware, store=store, **options)
+    return app
+
+
+def test_requests_with_the_token_are_profiled():
+    store = ProfileStore()
+    client = TestClient(profiled_app(store, token="secret"))
+
+    client.get("/work")
+    client.get("/work", headers={"X-Profile-Token": "wrong"})
+    assert store.list() == []
+
+    assert client.get("/work", headers={"X-Profile-Token": "secret"}).json() == {"done": True}
+    [capture] = store.list()
+    assert (capture["method"], capture["path"], capture["status"], capture["trigger"]) == ("GET", "/work", 200, "header")
+    assert capture["samples"] > 0
+    assert "folded" not in capture
+    assert "blocking_call" in store.get(capture["id"])["folded"]
+
+
+def test_sampled_requests_are_profiled():
+    store = ProfileStore()
+    client = TestClient(profiled_app(store, token="", sample_rate=1))
+
+    client.get("/work")
+
+    assert [capture["trigger"] for capture in store.list()] == ["sampled"]
+
+
+def test_the_store_keeps_the_latest_captures():
+    store = ProfileStore(size=2)
+    for index in range(3):
+        store.add({"id": str(index), "folded": ""})
+
+    assert [capture["id"] for capture in store.list()] == ["2", "1"]
+    assert store.get("0") is None
+
+
+def test_admin_endpoints_need_the_token(client, monkeypatch):
+    import main
+
+    assert client.get("/admin/profiles").status_code == 404
+
+    monkeypatch.setattr(main, "PROFILING_TOKEN", "secret")
+    main.profiles.add({"id": "capture-1", "path": "/tasks", "folded": "main;handler 3"})
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+
+    headers = {"X-Profile-Token": "secret"}
+    assert client.get("/admin/profiles", headers=headers).json()[0] == {"id": "capture-1", "path": "/tasks"}
+    assert client.get("/admin/profiles/capture-1", headers=headers).text == "main;handler 3"
+    assert client.get("/admin/profiles/missing", headers=headers).status_code == 404
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+
+from services import recurrence
+
+
+def weekly(event_id="series", **fields):
+    return {"id": event_id, "title": "Standup", "due_date": "2030-01-07T09:00:00", "rrule": "FREQ=WEEKLY", **fields}
+
+
+@pytest.fixture(autouse=True)
+def clear_expansions():
+    recurrence._expansions.clear()
+
+
+def test_expands_occurrences_inside_the_window():
+    occurrences, truncated = recurrence.expand(weekly(), datetime(2030, 1, 10), datetime(2030, 1, 31, 23, 59))
+
+    assert not truncated
+    assert [occurrence["due_date"] for occurrence in occurrences] == [
+        "2030-01-14T09:00:00", "2030-01-21T09:00:00", "2030-01-28T09:00:00",
+    ]
+    assert occurrences[0]["series_id"] == "series"
+    assert occurrences[0]["occurrence_id"] == "series:2030-01-14T09:00:00"
+
+
+def test_exdates_are_skipped():
+    event = weekly(exdates=["2030-01-14T09:00:00"])
+
+    occurrences, _ = recurrence.expand(event, datetime(2030, 1, 10), datetime(2030, 1, 22))
+
+    assert [occurrence["due_date"] for occurrence in occurrences] == ["2030-01-21T09:00:00"]
+
+
+def test_changed_rules_are_not_served_from_the_cache():
+    window = (datetime(2030, 1, 1), datetime(2030, 1, 31))
+    assert len(recurrence.expand(weekly(), *window)[0]) == 4
+
+    assert len(recurrence.expand(weekly(rrule="FREQ=WEEKLY;COUNT=2"), *window)[0]) == 2
+
+
+def test_single_events_are_returned_as_they_are():
+    event = {"id": "single", "due_date": "2030-01-07T09:00:00", "rrule": None}
+
+    assert recurrence.expand(event, datetime(2030, 1, 1), datetime(2030, 1, 31)) == ([event], False)
+
+
+def test_recurrence_end():
+    assert recurrence.recurrence_end(weekly()) == recurrence.OPEN_ENDED
+    assert recurrence.recurrence_end(weekly(rrule="FREQ=DAILY;COUNT=3")) == "2030-01-09T09:00:00"
+    assert recurrence.recurrence_end({"due_date": "2030-01-07T09:00:00"}) == "2030-01-07T09:00:00"
+
+
+def test_validate_rejects_bad_rules():
+    recurrence.validate(weekly())
+    with pytest.raises(ValueError):
+        recurrence.validate(weekly(rrule="FREQ=NOPE"))
+    with pytest.raises(ValueError):
+        recurrence.validate(weekly(exdates=["not a date"]))
+    with pytest.raises(ValueError):
+        recurrence.validate(weekly(rrule="FREQ=MINUTELY"))
+
+
+def test_windows_cut_at_the_occurrence_limit_are_flagged(monkeypatch):
+    monkeypatch.setattr(recurrence, "MAX_WINDOW_OCCURRENCES", 2)
+    window = (datetime(2030, 1, 1), datetime(2030, 1, 31))
+
+    occurrences, truncated = recurrence.expand_all([weekly(), weekly("short", rrule="FREQ=WEEKLY;COUNT=2")], *window)
+
+    assert len(occurrences) == 4
+    assert truncated == ["series"]
+
+
+def test_windows_far_from_the_series_start_are_refused(monkeypatch):
+    monkeypatch.setattr(recurrence, "MAX_EXPANSION_STEPS", 100)
+    event = weekly(rrule="FREQ=DAILY")
+
+    assert len(recurrence.expand(event, datetime(2030, 2, 1), datetime(2030, 2, 10))[0]) == 9
+    with pytest.raises(recurrence.ExpansionError):
+        recurrence.expand(event, datetime(2031, 1, 1), datetime(2031, 1, 2))
+
+
+def test_events_window(client, monkeypatch):
+    monkeypatch.setattr(recurrence, "MAX_WINDOW_OCCURRENCES", 3)
+    daily = {"title": "Standup", "type": "meeting", "due_date": "2030-01-01T09:00:00", "rrule": "FREQ=DAILY"}
+    assert client.post("/events", json={**daily, "rrule": "FREQ=HOURLY"}).status_code == 400
+    series = client.post("/events", json=daily).json()
+
+    response = client.get("/events", params={"from": "2030-01-02T00:00:00", "to": "2030-01-31T00:00:00"})
+    assert [event["due_date"][:10] for event in response.json()] == ["2030-01-02", "2030-01-03", "2030-01-04"]
+    assert response.headers["x-truncated-series"] == series["id"]
+
+    monkeypatch.setattr(recurrence, "MAX_EXPANSION_STEPS", 100)
+    response = client.get("/events", params={"from": "2031-01-01T00:00:00", "to": "2031-01-02T00:00:00"})
+    assert response.status_code == 400
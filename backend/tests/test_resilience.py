@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from services import resilience
+from services.resilience import AdaptiveLimiter, CircuitBreaker, Guard, Overloaded, TokenBucket, is_retryable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    monkeypatch.setattr(resilience.time, "sleep", lambda seconds: None)
+    return clock
+
+
+class ServiceError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.code = str(status)
+
+
+def failing(status):
+    def call():
+        raise ServiceError(status)
+    return call
+
+
+def test_retryable_errors():
+    assert is_retryable(ServiceError(503))
+    assert is_retryable(ServiceError(429))
+    assert not is_retryable(ServiceError(404))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(ValueError())
+
+
+def test_breaker_opens_then_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10)
+    breaker.failure()
+    assert not breaker.is_open
+    breaker.failure()
+    assert breaker.is_open
+    assert breaker.check() == 10
+
+    clock.now += 10
+    assert breaker.peek() == 0
+    assert breaker.check() == 0
+    # Only one trial at a time
+    assert breaker.check() > 0
+
+    breaker.failure()
+    assert breaker.check() == 10
+
+    clock.now += 10
+    assert breaker.check() == 0
+    breaker.success()
+    assert not breaker.is_open
+    assert breaker.check() == 0
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.take() == 0
+
+
+def test_limiter_compares_latency_per_operation():
+    limiter = AdaptiveLimiter(initial=10, tolerance=2)
+    for _ in range(5):
+        assert limiter.acquire()
+        limiter.release(0.01, operation="tasks.get")
+        assert limiter.acquire()
+        limiter.release(1.0, operation="tasks.list")
+    # Lists are slower than lookups, but not slower than earlier lists
+    grown = limiter.limit
+    assert grown > 10
+
+    assert limiter.acquire()
+    limiter.release(0.5, operation="tasks.get")
+    assert limiter.limit < grown
+
+
+def test_limiter_rejects_over_the_limit():
+    limiter = AdaptiveLimiter(initial=1)
+    assert limiter.acquire()
+    assert not limiter.acquire()
+    limiter.cancel()
+    assert limiter.acquire()
+
+
+def test_guard_retries_then_succeeds(clock):
+    guard = Guard("Service", attempts=3)
+    results = iter([ServiceError(503), "ok"])
+
+    def call():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert guard.call(call) == "ok"
+    assert guard.breaker.failures == 0
+    assert guard.limiter.inflight == 0
+
+
+def test_guard_passes_client_errors_through(clock):
+    guard = Guard("Service")
+
+    with pytest.raises(ServiceError):
+        guard.call(failing(404))
+    assert not guard.breaker.is_open
+
+
+def test_guard_opens_the_circuit_and_fails_fast(clock):
+    guard = Guard("Service", breaker=CircuitBreaker(threshold=2, reset_timeout=30), attempts=5)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ServiceError(503)
+
+    with pytest.raises(Overloaded) as error:
+        guard.call(call)
+    assert len(calls) == 2
+    assert error.value.retry_after >= 30
+
+    with pytest.raises(Overloaded):
+        guard.call(call)
+    with pytest.raises(Overloaded):
+        guard.check()
+    assert len(calls) == 2
+    assert guard.limiter.inflight == 0
+
+
+def test_guard_rate_limit(clock):
+    guard = Guard("Service", bucket=TokenBucket(rate=1, capacity=1))
+    assert guard.call(lambda: "ok") == "ok"
+
+    with pytest.raises(Overloaded) as error:
+        guard.call(lambda: "ok")
+    assert error.value.retry_after == pytest.approx(1)
+
+
+def test_guard_does_not_retry_on_the_event_loop(clock):
+    guard = Guard("Service", breaker=CircuitBreaker(threshold=10), attempts=3)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ServiceError(503)
+
+    async def on_loop():
+        with pytest.raises(Overloaded):
+            guard.call(call)
+
+    asyncio.run(on_loop())
+    assert len(calls) == 1
+
+
+def test_overloaded_is_answered_with_503(client, monkeypatch):
+    import main
+
+    def overloaded(*args, **kwargs):
+        raise Overloaded("Supabase", 2.5)
+
+    monkeypatch.setattr(main.repository, "select", overloaded)
+    response = client.get("/tasks/some-task")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+
+
+def test_drive_calls_do_not_use_the_database_threads(client, monkeypatch):
+    import threading
+    import main
+
+    threads = []
+
+    def upload_file(file, project_id=None):
+        threads.append(threading.current_thread().name)
+        return {"file_id": "file-1", "file_url": "https://drive/file-1", "content": b""}
+
+    monkeypatch.setattr(main, "upload_file", upload_file)
+    response = client.post("/files", data={"folder_id": "folder-1"}, files={"file": ("a.bin", b"data")})
+
+    assert response.status_code == 200
+    assert threads[0].startswith("drive")
+    assert main.drive_executor._max_workers == main.DRIVE_MAX_CONCURRENCY
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+from services.rollups import RollupIndex, TableRollups
+
+
+def task(task_id, status="todo", due_date="2999-01-01T00:00:00", employee_id="employee-1", project_id="project-1"):
+    return {"id": task_id, "status": status, "due_date": due_date, "employee_id": employee_id,
+            "project_id": project_id}
+
+
+def test_apply_counts_each_row_once():
+    rollups = RollupIndex()
+    rollups.apply("tasks", task("a"))
+    rollups.apply("tasks", task("a"))
+    rollups.apply("tasks", task("b", status="completed"))
+    rollups.apply("reminders", {"id": "r", "status": False, "employee_id": "employee-1"})
+    rollups.apply("notes", {"id": "n", "employee_id": "employee-1"})
+
+    stats = rollups.stats("employees", "employee-1")
+    assert stats["total_tasks"] == 2
+    assert stats["open_tasks"] == 1
+    assert stats["completed_tasks"] == 1
+    assert stats["completion_percentage"] == 50.0
+    assert stats["pending_reminders"] == 1
+    assert stats["notes"] == 1
+    assert rollups.stats("projects", "project-1")["total_tasks"] == 2
+
+
+def test_updates_move_contributions_between_entities():
+    rollups = RollupIndex()
+    rollups.apply("tasks", task("a"))
+    rollups.apply("tasks", task("a", status="completed", employee_id="employee-2"))
+
+    assert rollups.stats("employees", "employee-1")["total_tasks"] == 0
+    assert rollups.stats("employees", "employee-2")["completed_tasks"] == 1
+
+    rollups.remove("tasks", "a")
+    assert rollups.stats("employees", "employee-2")["total_tasks"] == 0
+    assert rollups.stats("projects", "project-1")["total_tasks"] == 0
+
+
+def test_open_tasks_become_overdue_when_due(monkeypatch):
+    rollups = RollupIndex()
+    rollups.apply("tasks", task("past", due_date="2000-01-01T00:00:00"))
+    rollups.apply("tasks", task("soon", due_date="2100-01-01T00:00:00"))
+    assert rollups.stats("employees", "employee-1")["overdue_tasks"] == 1
+
+    later = time.time() + 200 * 365 * 24 * 3600
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert rollups.stats("employees", "employee-1")["overdue_tasks"] == 2
+
+    # Completing an overdue task takes it out of overdue_tasks
+    rollups.apply("tasks", task("soon", status="completed", due_date="2100-01-01T00:00:00"))
+    assert rollups.stats("employees", "employee-1")["overdue_tasks"] == 1
+
+
+def test_rebuild_matches_incremental_counters(repository):
+    rows = [task(f"task-{index}", status="completed" if index % 4 == 0 else "todo") for index in range(10)]
+    repository.insert_many("tasks", [{**row, "title": "t", "priority": "low"} for row in rows])
+    incremental = RollupIndex()
+    for row in rows:
+        incremental.apply("tasks", row)
+    rebuilt = RollupIndex()
+    rebuilt.apply("tasks", task("stale"))
+
+    asyncio.run(rebuilt.rebuild(repository))
+
+    assert rebuilt.stats("employees", "employee-1") == incremental.stats("employees", "employee-1")
+
+
+def test_changes_during_a_rebuild_are_kept(repository):
+    repository.insert("tasks", {**task("old"), "title": "t", "priority": "low"})
+    rollups = RollupIndex()
+
+    async def rebuild_while_writing():
+        rebuild = asyncio.create_task(rollups.rebuild(repository))
+        await asyncio.sleep(0)
+        # Applied after the read started, so the read may not see it
+        rollups.apply("tasks", task("new", employee_id="employee-2"))
+        rollups.remove("tasks", "old")
+        await rebuild
+
+    asyncio.run(rebuild_while_writing())
+
+    assert rollups.stats("employees", "employee-1")["total_tasks"] == 0
+    assert rollups.stats("employees", "employee-2")["total_tasks"] == 1
+
+
+def test_stats_are_served_once_the_startup_rebuild_finishes(client):
+    import main
+
+    # Started by the lifespan handler without waiting for it
+    deadline = time.monotonic() + 5
+    while not main.rollups.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert main.rollups.ready
+
+    main.rollups.ready = False
+    response = client.get("/employees/employee-1/stats")
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+
+    client.portal.call(main.rollups.rebuild, main.repository)
+    assert client.get("/employees/employee-1/stats").json()["total_tasks"] == 0
+
+
+def test_table_counters_match_the_in_memory_ones(repository):
+    rows = {
+        "tasks": [
+            {**task("open"), "title": "t", "priority": "low"},
+            {**task("overdue", due_date="2000-01-01T00:00:00"), "title": "t", "priority": "low"},
+            {**task("done", status="completed", project_id=None), "title": "t", "priority": "low"},
+            {**task("moved", employee_id="employee-2"), "title": "t", "priority": "low"},
+        ],
+        "reminders": [{"id": "r", "title": "r", "status": False, "employee_id": "employee-1"}],
+        "events": [{"id": "e", "title": "e", "project_id": "project-1"}],
+        "notes": [{"id": "n", "title": "n", "employee_id": "employee-1", "project_id": "project-1"}],
+    }
+    for table, table_rows in rows.items():
+        repository.insert_many(table, table_rows)
+    repository.update("tasks", {"employee_id": "employee-1", "status": "completed"}, eq={"id": "moved"})
+    repository.delete("reminders", eq={"id": "r"})
+    memory = RollupIndex()
+    shared = TableRollups()
+
+    asyncio.run(memory.rebuild(repository))
+    asyncio.run(shared.rebuild(repository))
+
+    for kind, entity_id in [("employees", "employee-1"), ("employees", "employee-2"), ("projects", "project-1"),
+                            ("projects", "unknown")]:
+        assert shared.stats(kind, entity_id) == memory.stats(kind, entity_id)
+    assert shared.stats("employees", "employee-1")["overdue_tasks"] == 1
+    assert shared.stats("employees", "employee-1")["completed_tasks"] == 2
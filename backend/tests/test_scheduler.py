@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from services.scheduler import DueScheduler, Notifier
+
+
+class RecordingNotifier(Notifier):
+    def __init__(self):
+        self.notifications = []
+
+    async def notify(self, notification):
+        self.notifications.append(notification)
+
+
+def due(seconds: float) -> str:
+    return (datetime.now() + timedelta(seconds=seconds)).isoformat()
+
+
+def test_pops_due_items_in_due_order():
+    scheduler = DueScheduler()
+    scheduler.track("tasks", {"id": "late", "status": "todo", "due_date": due(-10)})
+    scheduler.track("reminders", {"id": "later", "status": False, "due_date": due(-5)})
+    scheduler.track("tasks", {"id": "future", "status": "todo", "due_date": due(3600)})
+
+    assert [key for key, _ in scheduler._pop_due()] == [("tasks", "late"), ("reminders", "later")]
+    assert scheduler._pop_due() == []
+    assert 0 < scheduler._next_delay() <= 3600
+
+
+def test_rescheduling_and_cancelling_drop_the_old_entry():
+    scheduler = DueScheduler()
+    scheduler.track("tasks", {"id": "task", "status": "todo", "due_date": due(-10)})
+    scheduler.track("tasks", {"id": "task", "status": "todo", "due_date": due(3600)})
+    assert scheduler._pop_due() == []
+
+    scheduler.track("tasks", {"id": "task", "status": "todo", "due_date": due(-1)})
+    scheduler.cancel("tasks", "task")
+    assert scheduler._pop_due() == []
+    assert scheduler._next_delay() is None
+
+
+def test_finished_items_are_not_tracked():
+    scheduler = DueScheduler()
+    scheduler.track("tasks", {"id": "done", "status": "completed", "due_date": due(-1)})
+    scheduler.track("reminders", {"id": "dismissed", "status": True, "due_date": due(-1)})
+    scheduler.track("tasks", {"id": "sent", "status": "todo", "notified": True, "due_date": due(-1)})
+    scheduler.track("tasks", {"id": "undated", "status": "todo", "due_date": None})
+
+    assert scheduler._pop_due() == []
+
+
+def test_fire_notifies_once(repository):
+    notifier = RecordingNotifier()
+    scheduler = DueScheduler(notifiers=[notifier])
+    scheduler.db = repository
+    due_date = due(-1)
+    repository.insert("reminders", {"id": "reminder", "title": "Call", "status": False, "due_date": due_date})
+
+    asyncio.run(scheduler._fire(("reminders", "reminder"), due_date))
+    # A second worker firing the same item matches nothing
+    asyncio.run(scheduler._fire(("reminders", "reminder"), due_date))
+
+    assert [notification["id"] for notification in notifier.notifications] == ["reminder"]
+    assert notifier.notifications[0]["type"] == "reminder"
+    assert repository.get("reminders", "reminder")["notified"] is True
+
+
+def test_fire_skips_rescheduled_items(repository):
+    notifier = RecordingNotifier()
+    scheduler = DueScheduler(notifiers=[notifier])
+    scheduler.db = repository
+    repository.insert("tasks", {"id": "task", "title": "Ship", "status": "todo", "due_date": due(3600)})
+
+    asyncio.run(scheduler._fire(("tasks", "task"), due(-1)))
+
+    assert notifier.notifications == []
+
+
+def test_load_schedules_pending_rows(repository):
+    repository.insert_many("tasks", [
+        {"id": f"task-{index}", "title": "t", "status": "todo", "due_date": due(60 + index)} for index in range(5)
+    ])
+    repository.insert("tasks", {"id": "done", "title": "t", "status": "completed", "due_date": due(60)})
+    repository.insert("reminders", {"id": "reminder", "title": "r", "status": False, "due_date": due(60)})
+    scheduler = DueScheduler()
+    scheduler.db = repository
+
+    asyncio.run(scheduler.load())
+
+    assert set(scheduler._entries) == {("tasks", f"task-{index}") for index in range(5)} | {("reminders", "reminder")}
+
+
+def test_changes_during_a_load_are_kept(repository):
+    repository.insert("reminders", {"id": "moved", "title": "r", "status": False, "due_date": due(60)})
+    repository.insert("reminders", {"id": "deleted", "title": "r", "status": False, "due_date": due(60)})
+    scheduler = DueScheduler()
+    scheduler.db = repository
+    later = due(7200)
+
+    async def load_while_writing():
+        load = asyncio.create_task(scheduler.load())
+        await asyncio.sleep(0)
+        # Handled after the read started, so the read may return the old rows
+        scheduler.track("reminders", {"id": "moved", "status": False, "due_date": later})
+        scheduler.cancel("reminders", "deleted")
+        await load
+
+    asyncio.run(load_while_writing())
+
+    assert set(scheduler._entries) == {("reminders", "moved")}
+    assert scheduler._entries[("reminders", "moved")][1] == later
+
+
+def test_only_a_new_due_date_fires_an_item_again(client):
+    import main
+
+    reminder = {"title": "Call", "due_date": due(3600), "priority": "low", "status": False}
+    created = client.post("/reminders", json=reminder).json()
+    main.repository.update("reminders", {"notified": True}, eq={"id": created["id"]})
+    task = client.post("/tasks", data={"title": "Ship", "status": "todo", "priority": "low",
+                                       "due_date": due(3600)}).json()
+    main.repository.update("tasks", {"notified": True}, eq={"id": task["id"]})
+
+    client.put(f"/reminders/{created['id']}", json={**reminder, "title": "Call back"})
+    client.put(f"/tasks/{task['id']}", data={"title": "Ship it", "due_date": task["due_date"]})
+    assert main.repository.get("reminders", created["id"])["notified"] is True
+    assert main.repository.get("tasks", task["id"])["notified"] is True
+
+    client.put(f"/reminders/{created['id']}", json={**reminder, "due_date": due(7200)})
+    client.put(f"/tasks/{task['id']}", data={"due_date": due(7200)})
+    assert main.repository.get("reminders", created["id"])["notified"] is False
+    assert main.repository.get("tasks", task["id"])["notified"] is False
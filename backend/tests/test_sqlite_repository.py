@@ -0,0 +1,105 @@
+import pytest
+
+from database.repository import Repository
+
+
+def add_tasks(repository, count):
+    repository.insert_many("tasks", [{
+        "id": f"task-{index:03d}",
+        "title": f"Task {index}",
+        "status": "completed" if index % 3 == 0 else "todo",
+        "priority": "low",
+        "due_date": f"2030-05-{index % 5 + 1:02d}T{index % 24:02d}:00:00",
+        "project_id": "project-1" if index % 2 else None,
+    } for index in range(count)])
+
+
+def test_insert_and_select_round_trip_types(repository):
+    rows = repository.insert("events", {"id": "event-1", "title": "Standup", "due_date": "2030-01-01T09:00:00",
+                                        "exdates": ["2030-01-02T09:00:00"]})
+    assert rows[0]["exdates"] == ["2030-01-02T09:00:00"]
+
+    repository.insert("reminders", {"id": "reminder-1", "title": "Call", "status": False})
+    reminder = repository.get("reminders", "reminder-1")
+    assert reminder["status"] is False
+    assert reminder["notified"] is False
+    assert repository.get("reminders", "missing") is None
+
+
+def test_select_filters(repository):
+    add_tasks(repository, 20)
+
+    assert len(repository.select("tasks", eq={"status": "completed"})) == 7
+    assert len(repository.select("tasks", neq={"status": "completed"})) == 13
+    assert len(repository.select("tasks", eq={"project_id": None})) == 10
+    assert len(repository.select("tasks", neq={"project_id": None})) == 10
+    in_range = repository.select("tasks", gte={"due_date": "2030-05-02"}, lt={"due_date": "2030-05-03"})
+    assert {row["due_date"][:10] for row in in_range} == {"2030-05-02"}
+    assert [row["id"] for row in repository.select("tasks", gt={"id": "task-017"})] == ["task-018", "task-019"]
+
+
+def test_count_matches_the_generic_implementation(repository):
+    add_tasks(repository, 20)
+    filters = {"neq": {"status": "completed"}, "lt": {"due_date": "2030-05-03"}}
+
+    assert repository.count("tasks", **filters) == Repository.count(repository, "tasks", **filters) == 5
+    assert repository.count("tasks") == 20
+
+
+def test_select_columns_order_and_limit(repository):
+    add_tasks(repository, 5)
+
+    rows = repository.select("tasks", "id,title", order="id", desc=True, limit=2)
+    assert rows == [{"id": "task-004", "title": "Task 4"}, {"id": "task-003", "title": "Task 3"}]
+
+
+def test_unknown_columns_are_rejected(repository):
+    with pytest.raises(ValueError):
+        repository.select("tasks", eq={"missing": 1})
+    with pytest.raises(ValueError):
+        repository.select("tasks", "id,missing")
+    with pytest.raises(ValueError):
+        repository.select("tasks", order="missing")
+
+
+def test_update_and_delete_return_affected_rows(repository):
+    add_tasks(repository, 6)
+
+    updated = repository.update("tasks", {"status": "completed"}, eq={"project_id": "project-1"})
+    assert sorted(row["id"] for row in updated) == ["task-001", "task-003", "task-005"]
+    assert all(row["status"] == "completed" for row in updated)
+
+    deleted = repository.delete("tasks", eq={"id": "task-000"})
+    assert [row["id"] for row in deleted] == ["task-000"]
+    assert repository.delete("tasks", eq={"id": "task-000"}) == []
+
+    repository.delete("tasks", lt={"id": "task-003"})
+    assert [row["id"] for row in repository.select("tasks", order="id")] == ["task-003", "task-004", "task-005"]
+
+
+def test_upsert_uses_the_table_primary_key(repository):
+    repository.upsert("file_previews", {"file_id": "file-1", "mime_type": "image/png", "preview_text": None})
+    repository.upsert("file_previews", {"file_id": "file-1", "mime_type": "image/webp", "preview_text": "x"})
+
+    rows = repository.select("file_previews")
+    assert rows == [{"file_id": "file-1", "thumbnail": None, "mime_type": "image/webp", "preview_text": "x"}]
+
+
+def test_select_all_reads_every_page(repository):
+    add_tasks(repository, 25)
+
+    rows = repository.select_all("tasks", "title", page_size=4, neq={"status": "completed"})
+    assert len(rows) == 16
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+
+def test_bucket_by_day_matches_the_generic_implementation(repository):
+    add_tasks(repository, 40)
+    columns = "id,title,due_date"
+
+    buckets = repository.bucket_by_day("tasks", "due_date", "2030-05-01", "2030-05-05", columns=columns, top=2)
+    assert buckets == Repository.bucket_by_day(repository, "tasks", "due_date", "2030-05-01", "2030-05-05",
+                                               columns=columns, top=2)
+    assert sorted(buckets) == ["2030-05-01", "2030-05-02", "2030-05-03", "2030-05-04"]
+    assert buckets["2030-05-01"]["count"] == 8
+    assert len(buckets["2030-05-01"]["items"]) == 2